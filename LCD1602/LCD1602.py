@@ -1,8 +1,9 @@
 import logging
 import pprint
-import time
 
-import RPi.GPIO as GPIO
+from LCD1602 import TIMING
+
+GPIO = None  # RPi.GPIO, imported by init() so that the I2C backpack subclass does without it
 
 
 class LCD1602(object):
@@ -13,21 +14,24 @@ class LCD1602(object):
     D5 = 23  # PIN 16
     D6 = 24  # PIN 18
     D7 = 25  # PIN 22
+    # D0-D3 are only wired for 8-bit mode
     WIDTH = 16
     HEIGHT = 2
     ADDRS = [0x80, 0xC0, 0x94, 0xD4]
 
-    def __init__(self, width=WIDTH, height=HEIGHT, rs=RS, e=E, d4=D4, d5=D5, d6=D6, d7=D7, line_addrs=None):
+    def __init__(self, width=WIDTH, height=HEIGHT, rs=RS, e=E, d4=D4, d5=D5, d6=D6, d7=D7, line_addrs=None,
+                 d0=None, d1=None, d2=None, d3=None, timing=None):
         self.logger = logging.getLogger('mole')
-        self.logger.debug("Creating new LCD control with parameters: \n" + pprint.pformat(locals()))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Creating new LCD control with parameters: \n%s", pprint.pformat(locals()))
         # Define some device constants
         if line_addrs is None:
             line_addrs = LCD1602.ADDRS
         self.LCD_CHR = True
         self.LCD_CMD = False
-        # Timing constants
-        self.E_PULSE = 0.0005
-        self.E_DELAY = 0.0005
+        if timing is None:
+            timing = TIMING.TIMING()
+        self.timing = timing
         self.LCD_WIDTH = width
         self.LCD_HEIGHT = height
         self.LCD_RS = rs
@@ -36,88 +40,107 @@ class LCD1602(object):
         self.LCD_D5 = d5
         self.LCD_D6 = d6
         self.LCD_D7 = d7
+        self.LCD_D0 = d0
+        self.LCD_D1 = d1
+        self.LCD_D2 = d2
+        self.LCD_D3 = d3
+        if None in (d0, d1, d2, d3):
+            self.bus_width = 4
+            self.data_pins = [d4, d5, d6, d7]
+        else:
+            self.bus_width = 8
+            self.data_pins = [d0, d1, d2, d3, d4, d5, d6, d7]
+        # Pin levels for every value the data bus can carry, LSB first
+        self.levels = [[(value >> i) & 1 == 1 for i in range(self.bus_width)] for value in range(1 << self.bus_width)]
         self.line_addrs = line_addrs
         self.cursorX = 0
         self.cursorY = 0
         self.buffer = [" ".ljust(width) for i in range(height)]
+        self.shown = [None for i in range(height)]  # What is on the glass, None when unknown
+        self.bytes_written = 0
+        self.bytes_skipped = 0
+        self.transactions = 0  # GPIO writes since start
 
     def lcd_toggle_enable(self):
         # Toggle enable
-        time.sleep(self.E_DELAY)
+        self.transactions += 2
         GPIO.output(self.LCD_E, True)
-        time.sleep(self.E_PULSE)
+        self.timing.wait(TIMING.TIMING.E_PULSE)
         GPIO.output(self.LCD_E, False)
-        time.sleep(self.E_DELAY)
+        self.timing.wait(TIMING.TIMING.E_CYCLE - TIMING.TIMING.E_PULSE)
+
+    def lcd_write(self, value):
+        # Put one bus width of data on the pins and latch it
+        self.transactions += 1
+        GPIO.output(self.data_pins, self.levels[value])
+        self.lcd_toggle_enable()
 
     def lcd_byte(self, bits, mode):
         # Send byte to data pins
         # bits = data
         # mode = True  for character
         #        False for command
+        self.bytes_written += 1
+        self.transactions += 1
         GPIO.output(self.LCD_RS, mode)  # RS
-        # High bits
-        GPIO.output(self.LCD_D4, False)
-        GPIO.output(self.LCD_D5, False)
-        GPIO.output(self.LCD_D6, False)
-        GPIO.output(self.LCD_D7, False)
-        if bits & 0x10 == 0x10:
-            GPIO.output(self.LCD_D4, True)
-        if bits & 0x20 == 0x20:
-            GPIO.output(self.LCD_D5, True)
-        if bits & 0x40 == 0x40:
-            GPIO.output(self.LCD_D6, True)
-        if bits & 0x80 == 0x80:
-            GPIO.output(self.LCD_D7, True)
-        # Toggle 'Enable' pin
-        self.lcd_toggle_enable()
-        # Low bits
-        GPIO.output(self.LCD_D4, False)
-        GPIO.output(self.LCD_D5, False)
-        GPIO.output(self.LCD_D6, False)
-        GPIO.output(self.LCD_D7, False)
-        if bits & 0x01 == 0x01:
-            GPIO.output(self.LCD_D4, True)
-        if bits & 0x02 == 0x02:
-            GPIO.output(self.LCD_D5, True)
-        if bits & 0x04 == 0x04:
-            GPIO.output(self.LCD_D6, True)
-        if bits & 0x08 == 0x08:
-            GPIO.output(self.LCD_D7, True)
-        # Toggle 'Enable' pin
-        self.lcd_toggle_enable()
+        if self.bus_width == 8:
+            self.lcd_write(bits)
+        else:
+            self.lcd_write(bits >> 4)  # High bits
+            self.lcd_write(bits & 0x0F)  # Low bits
+        if mode == self.LCD_CMD and bits < 0x04:
+            self.timing.wait(TIMING.TIMING.EXEC_LONG)  # Clear display, return home
+        else:
+            self.timing.wait(TIMING.TIMING.EXEC)
+
+    def lcd_function_set(self):
+        # Initialisation by instruction: three 8-bit function sets, then the real one
+        self.transactions += 1
+        GPIO.output(self.LCD_RS, self.LCD_CMD)
+        wake_up = 0x03 if self.bus_width == 4 else 0x30
+        self.lcd_write(wake_up)
+        self.timing.wait(TIMING.TIMING.EXEC_INIT)
+        self.lcd_write(wake_up)
+        self.timing.wait(TIMING.TIMING.EXEC_LONG)
+        self.lcd_write(wake_up)
+        self.timing.wait(TIMING.TIMING.EXEC)
+        if self.bus_width == 4:
+            self.lcd_write(0x02)  # Switch to 4-bit
+            self.timing.wait(TIMING.TIMING.EXEC)
+            self.lcd_byte(0x28, self.LCD_CMD)  # 101000 Data length, number of lines, font size
+        else:
+            self.lcd_byte(0x38, self.LCD_CMD)  # 111000 Data length, number of lines, font size
 
     def init(self):
+        global GPIO
+        import RPi.GPIO as GPIO
         GPIO.setwarnings(False)
         GPIO.setmode(GPIO.BCM)  # Use BCM GPIO numbers
         GPIO.setup(self.LCD_E, GPIO.OUT)  # E
         GPIO.setup(self.LCD_RS, GPIO.OUT)  # RS
-        GPIO.setup(self.LCD_D4, GPIO.OUT)  # DB4
-        GPIO.setup(self.LCD_D5, GPIO.OUT)  # DB5
-        GPIO.setup(self.LCD_D6, GPIO.OUT)  # DB6
-        GPIO.setup(self.LCD_D7, GPIO.OUT)  # DB7
+        for pin in self.data_pins:
+            GPIO.setup(pin, GPIO.OUT)  # DB0-DB7 or DB4-DB7
+        self.timing.calibrate()
         # Initialise display
-        self.lcd_byte(0x33, self.LCD_CMD)  # 110011 Initialise
-        self.lcd_byte(0x32, self.LCD_CMD)  # 110010 Initialise
+        self.lcd_function_set()
         self.lcd_byte(0x06, self.LCD_CMD)  # 000110 Cursor move direction
         self.lcd_byte(0x0C, self.LCD_CMD)  # 001100 Display On,Cursor Off, Blink Off
-        self.lcd_byte(0x28, self.LCD_CMD)  # 101000 Data length, number of lines, font size
         self.lcd_byte(0x01, self.LCD_CMD)  # 000001 Clear display
-        time.sleep(self.E_DELAY)
+        self.shown = [" ".ljust(self.LCD_WIDTH) for i in range(self.LCD_HEIGHT)]
 
     def finish(self):
-        self.lcd_byte(0x33, self.LCD_CMD)  # 110011 Initialise
-        self.lcd_byte(0x32, self.LCD_CMD)  # 110010 Initialise
+        self.lcd_function_set()
         self.lcd_byte(0x06, self.LCD_CMD)  # 000110 Cursor move direction
         self.lcd_byte(0x08, self.LCD_CMD)  # 001000 Display Off,Cursor Off, Blink Off
-        self.lcd_byte(0x28, self.LCD_CMD)  # 101000 Data length, number of lines, font size
         self.lcd_byte(0x01, self.LCD_CMD)  # 000001 Clear display
-        time.sleep(self.E_DELAY)
+        self.shown = [None for i in range(self.LCD_HEIGHT)]
         GPIO.cleanup()
 
     def clear(self):
         self.lcd_byte(0x01, self.LCD_CMD)
         for j in range(0, self.LCD_HEIGHT):
             self.buffer[j] = " ".ljust(self.LCD_WIDTH)
+            self.shown[j] = self.buffer[j]
         self.cursorX = 0
         self.cursorY = 0
 
@@ -141,6 +164,7 @@ class LCD1602(object):
         for i in range(self.LCD_WIDTH):
             self.lcd_byte(ord(message[i]), self.LCD_CHR)
         self.buffer[line - 1] = message
+        self.shown[line - 1] = message
 
     def print(self, message, justify=0, newline=False):
         if not newline:
@@ -157,7 +181,21 @@ class LCD1602(object):
 
     def print_buffer(self, page):
         self.buffer = page
+        # DDRAM address the next character lands on, the controller increments it after every write
+        cursor = None
         for line in range(self.LCD_HEIGHT):
-            self.lcd_byte(self.line_addrs[line], self.LCD_CMD)
+            text = self.buffer[line][0:self.LCD_WIDTH].ljust(self.LCD_WIDTH)
+            shown = self.shown[line]
+            if shown == text:
+                self.bytes_skipped += self.LCD_WIDTH
+                continue
             for i in range(self.LCD_WIDTH):
-                self.lcd_byte(ord(self.buffer[line][i]), self.LCD_CHR)
+                if shown is not None and shown[i] == text[i]:
+                    self.bytes_skipped += 1
+                    continue
+                addr = self.line_addrs[line] + i
+                if cursor != addr:
+                    self.lcd_byte(addr, self.LCD_CMD)
+                self.lcd_byte(ord(text[i]), self.LCD_CHR)
+                cursor = addr + 1
+            self.shown[line] = text
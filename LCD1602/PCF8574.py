@@ -0,0 +1,90 @@
+import logging
+
+from smbus import SMBus
+
+from LCD1602 import LCD1602
+from LCD1602 import TIMING
+
+
+class PCF8574(LCD1602.LCD1602):
+    # HD44780 behind a PCF8574 I2C backpack, the usual wiring: P0 RS, P1 RW, P2 E, P3 backlight, P4-P7 D4-D7
+    SMBUS: int = 1
+    ADDRESS: int = 0x27
+    RS: int = 0x01
+    E: int = 0x04
+    BACKLIGHT: int = 0x08
+    BLOCK_SIZE: int = 33  # Register byte plus the SMBus block write limit, every byte is latched by the expander
+
+    def __init__(self, width=LCD1602.LCD1602.WIDTH, height=LCD1602.LCD1602.HEIGHT, smbus_addr=SMBUS,
+                 address=ADDRESS, line_addrs=None, backlight=True, timing=None):
+        super().__init__(width, height, line_addrs=line_addrs, timing=timing)
+        self.logger = logging.getLogger('mole')
+        self.smbus_addr = smbus_addr
+        self.address = address
+        self.backlight = PCF8574.BACKLIGHT if backlight else 0
+        self.i2c = SMBus(self.smbus_addr)
+        # Expander port values not sent yet
+        self.pending = bytearray()
+
+    def flush(self, keep=0):
+        # Sends the pending port values in block writes, up to keep of them may stay pending for the next block
+        while len(self.pending) > keep:
+            block = self.pending[:PCF8574.BLOCK_SIZE]
+            del self.pending[:PCF8574.BLOCK_SIZE]
+            self.transactions += 1
+            self.i2c.write_i2c_block_data(self.address, block[0], list(block[1:]))
+
+    def lcd_nibble(self, value):
+        # Data and RS settle before E rises and stay while it falls. One expander write takes 22.5 us even at
+        # 400 kHz, so three of them cover the enable pulse and cycle times without any sleep.
+        self.pending += bytes((value, value | PCF8574.E, value))
+
+    def lcd_byte(self, bits, mode):
+        self.bytes_written += 1
+        value = (PCF8574.RS if mode else 0) | self.backlight
+        self.lcd_nibble(value | (bits & 0xF0))
+        self.lcd_nibble(value | ((bits << 4) & 0xF0))
+        if mode == self.LCD_CMD and bits < 0x04:
+            self.flush()
+            self.timing.wait(TIMING.TIMING.EXEC_LONG)  # Clear display, return home
+        else:
+            # Six expander writes per byte outlast the execution time of the previous one
+            self.flush(PCF8574.BLOCK_SIZE - 1)
+
+    def lcd_function_set(self):
+        # Initialisation by instruction, the expander only has D4-D7 wired: three 8-bit function sets, then 4-bit
+        for wait in (TIMING.TIMING.EXEC_INIT, TIMING.TIMING.EXEC_LONG, TIMING.TIMING.EXEC):
+            self.lcd_nibble(self.backlight | 0x30)
+            self.flush()
+            self.timing.wait(wait)
+        self.lcd_nibble(self.backlight | 0x20)  # Switch to 4-bit
+        self.lcd_byte(0x28, self.LCD_CMD)  # 101000 Data length, number of lines, font size
+
+    def init(self):
+        self.timing.calibrate()
+        self.lcd_function_set()
+        self.lcd_byte(0x06, self.LCD_CMD)  # 000110 Cursor move direction
+        self.lcd_byte(0x0C, self.LCD_CMD)  # 001100 Display On,Cursor Off, Blink Off
+        self.lcd_byte(0x01, self.LCD_CMD)  # 000001 Clear display
+        self.shown = [" ".ljust(self.LCD_WIDTH) for i in range(self.LCD_HEIGHT)]
+
+    def finish(self):
+        self.lcd_byte(0x08, self.LCD_CMD)  # 001000 Display Off,Cursor Off, Blink Off
+        self.lcd_byte(0x01, self.LCD_CMD)  # 000001 Clear display
+        self.shown = [None for i in range(self.LCD_HEIGHT)]
+        self.backlight = 0
+        self.pending.append(0)
+        self.flush()
+        self.i2c.close()
+
+    def clear(self):
+        super().clear()
+        self.flush()
+
+    def print_line(self, message, line, justify=0):
+        super().print_line(message, line, justify)
+        self.flush()
+
+    def print_buffer(self, page):
+        super().print_buffer(page)
+        self.flush()
@@ -0,0 +1,51 @@
+import logging
+import time
+
+
+class TIMING(object):
+    # HD44780 datasheet minimums
+    E_PULSE: float = 0.00000045  # Enable pulse width
+    E_CYCLE: float = 0.000001    # Enable cycle time
+    EXEC: float = 0.000037       # Execution time of most instructions
+    EXEC_LONG: float = 0.00152   # Clear display, return home
+    EXEC_INIT: float = 0.0041    # After the first function set of the initialisation by instruction
+    MARGIN: float = 1.5          # The datasheet times are for a 270 kHz oscillator at 5 V
+    SAMPLES: int = 50
+
+    def __init__(self, margin=MARGIN, fixed=None):
+        self.logger = logging.getLogger('mole')
+        self.margin = margin
+        # fixed: sleep this long for every wait, like the original driver did
+        self.fixed = fixed
+        self.clock_cost = 0.0
+        self.sleep_overshoot = 0.0
+
+    def calibrate(self, samples=SAMPLES):
+        # Waits shorter than reading the clock are already covered by the call overhead
+        start = time.perf_counter()
+        for i in range(samples):
+            time.perf_counter()
+        self.clock_cost = (time.perf_counter() - start) / samples
+        # How much a short sleep overshoots, anything shorter than this is busy-waited
+        overshoot = []
+        for i in range(samples):
+            start = time.perf_counter()
+            time.sleep(TIMING.EXEC)
+            overshoot.append(time.perf_counter() - start - TIMING.EXEC)
+        overshoot.sort()
+        self.sleep_overshoot = overshoot[len(overshoot) // 2]
+        self.logger.debug('LCD timing calibrated: clock %.2f us, sleep overshoot %.1f us' %
+                          (self.clock_cost * 1000000, self.sleep_overshoot * 1000000))
+
+    def wait(self, seconds):
+        if self.fixed is not None:
+            time.sleep(self.fixed)
+            return
+        seconds *= self.margin
+        if seconds <= self.clock_cost:
+            return
+        deadline = time.perf_counter() + seconds
+        if seconds > self.sleep_overshoot:
+            time.sleep(seconds - self.sleep_overshoot)
+        while time.perf_counter() < deadline:
+            pass
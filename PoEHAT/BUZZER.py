@@ -9,11 +9,21 @@ import RPi.GPIO as GPIO
 class BUZZER(object):
     # Default GPIO to LCD mapping:
     B: int = 21  # PIN 40
+    WINDOW: float = 0.2      # Requests arriving this close together become one pattern
+    GAP: float = 0.1         # Silence between the beeps of a pattern
 
-    def __init__(self, buzzer=B):
+    def __init__(self, buzzer=B, window=WINDOW):
         self.logger = logging.getLogger('mole')
-        self.logger.debug("Creating new BUZZER control with parameters: \n" + pprint.pformat(locals()))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Creating new BUZZER control with parameters: \n%s", pprint.pformat(locals()))
         self.BUZZER = buzzer
+        self.window = window
+        # Pending (duration, count), requests arriving before the buzzer task takes it are merged into it
+        self.pending = None
+        self.lock = threading.Lock()
+        # Called when a new pattern is pending, the caller plays it
+        self.listener = None
+        self.coalesced = 0
 
     def init(self):
         GPIO.setwarnings(False)
@@ -35,6 +45,20 @@ class BUZZER(object):
         time.sleep(duration)
         self.off()
 
-    def background_beep(self, duration):
-        thread = threading.Thread(target=self.beep, args=(duration,))
-        thread.start()
+    def background_beep(self, duration, count=1):
+        with self.lock:
+            first = self.pending is None
+            if first:
+                self.pending = (duration, count)
+            else:
+                self.pending = (max(duration, self.pending[0]), max(count, self.pending[1]))
+                self.coalesced += 1
+        if first and self.listener is not None:
+            self.listener()
+
+    def take(self):
+        # Returns the pending (duration, count) and clears it
+        with self.lock:
+            pending = self.pending
+            self.pending = None
+        return pending
@@ -1,5 +1,6 @@
 import logging
 import pprint
+import time
 
 import smbus
 
@@ -10,16 +11,33 @@ class FAN(object):
 
     def __init__(self, smbus_addr=SMBUS, address=ADDRESS):
         self.logger = logging.getLogger('mole')
-        self.logger.debug("Creating new FAN control with parameters: \n" + pprint.pformat(locals()))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Creating new FAN control with parameters: \n%s", pprint.pformat(locals()))
         self.smbus_addr = smbus_addr
         self.address = address
         self.i2c = smbus.SMBus(self.smbus_addr)
         self.running = False
+        self.transactions = 0  # I2C reads and writes since start
+        self.on_seconds = 0.0  # Time the fan ran before it was last turned off
+        self.on_since = None
 
     def off(self):
+        self.transactions += 2
         self.i2c.write_byte(self.address, 0x01 | self.i2c.read_byte(self.address))
+        if self.on_since is not None:
+            self.on_seconds += time.monotonic() - self.on_since
+            self.on_since = None
         self.running = False
 
     def on(self):
+        self.transactions += 2
         self.i2c.write_byte(self.address, 0xFE & self.i2c.read_byte(self.address))
+        if self.on_since is None:
+            self.on_since = time.monotonic()
         self.running = True
+
+    def on_time(self):
+        # Seconds the fan has run since start, the duty cycle is its rate
+        if self.on_since is None:
+            return self.on_seconds
+        return self.on_seconds + time.monotonic() - self.on_since
@@ -1,7 +1,5 @@
 import logging
 import pprint
-import threading
-import time
 
 from PoEHAT import FAN
 
@@ -13,22 +11,13 @@ class FANCONTROL(object):
 
     def __init__(self, fan, interval=5, temp_min=TEMP_MIN, temp_max=TEMP_MAX, thermal=THERMAL):
         self.logger = logging.getLogger('mole')
-        self.logger.debug("Creating new FANCONTROL control with parameters: \n" + pprint.pformat(locals()))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Creating new FANCONTROL control with parameters: \n%s", pprint.pformat(locals()))
         self.interval = interval
         self.temp_min = temp_min
         self.temp_max = temp_max
         self.thermal = thermal
-        self.thread = threading.Thread(target=self.run, args=())
-        self.thread.daemon = True  # Daemonize thread
         self.fan: FAN = fan
-        self.running = False
-
-    def start(self):
-        self.running = True
-        self.thread.start()  # Start the execution
-
-    def stop(self):
-        self.running = False
 
     def temp(self):
         with open(self.thermal, 'rt') as f:
@@ -36,13 +25,12 @@ class FANCONTROL(object):
         f.close()
         return temp
 
-    def run(self):
-        while self.running:
-            temp = self.temp()
-            if temp > self.temp_max and not self.fan.running:
-                self.logger.info('Turning fan ON. Temp: ' + str(temp))
-                self.fan.on()
-            if temp < self.temp_min and self.fan.running:
-                self.logger.info('Turning fan OFF. Temp: ' + str(temp))
-                self.fan.off()
-            time.sleep(self.interval)
+    def step(self):
+        temp = self.temp()
+        if temp > self.temp_max and not self.fan.running:
+            self.logger.info('Turning fan ON. Temp: ' + str(temp))
+            self.fan.on()
+        if temp < self.temp_min and self.fan.running:
+            self.logger.info('Turning fan OFF. Temp: ' + str(temp))
+            self.fan.off()
+        return temp
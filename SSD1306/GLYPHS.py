@@ -0,0 +1,117 @@
+import collections
+import json
+import logging
+import os
+
+from PIL import Image, ImageDraw, ImageFont
+
+
+class GLYPHS(object):
+    FIRST: int = 0x20
+    LAST: int = 0x7e
+    ANCHOR: str = 'H'
+    LINE_CACHE: int = 64
+
+    def __init__(self, font_file, font_size, cache_file=None, line_cache=LINE_CACHE):
+        self.logger = logging.getLogger('mole')
+        self.font_file = font_file
+        self.font_size = font_size
+        if cache_file is None:
+            cache_file = os.path.splitext(font_file)[0] + '-' + str(font_size) + '.atlas'
+        self.cache_file = cache_file
+        self.line_cache = line_cache
+        self.font = None
+        self.height = 0
+        # Character -> list of column bit masks, the LSB is the top row of the glyph
+        self.glyphs = {}
+        # (text, y, width, pages) -> [(page, packed page bytes as int)], least recently used first
+        self.lines = collections.OrderedDict()
+        if not self.load():
+            self.build()
+            self.save()
+
+    def signature(self):
+        stat = os.stat(self.font_file)
+        return [os.path.basename(self.font_file), self.font_size, stat.st_size, int(stat.st_mtime)]
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'rt') as f:
+                atlas = json.load(f)
+            if atlas['signature'] != self.signature():
+                return False
+            self.height = atlas['height']
+            self.glyphs = atlas['glyphs']
+        except (OSError, ValueError, KeyError):
+            return False
+        self.logger.debug('Glyph atlas loaded from ' + self.cache_file)
+        return True
+
+    def save(self):
+        try:
+            with open(self.cache_file, 'wt') as f:
+                json.dump({'signature': self.signature(), 'height': self.height, 'glyphs': self.glyphs}, f)
+        except OSError as e:
+            # Read-only or overlay filesystems: keep the atlas in memory only
+            self.logger.debug('Glyph atlas not saved to ' + self.cache_file + ': ' + str(e))
+
+    def build(self):
+        self.font = ImageFont.truetype(self.font_file, self.font_size)
+        ascent, descent = self.font.getmetrics()
+        self.height = ascent + descent
+        for code in range(GLYPHS.FIRST, GLYPHS.LAST + 1):
+            self.rasterize(chr(code))
+
+    def rasterize(self, char):
+        if self.font is None:
+            self.font = ImageFont.truetype(self.font_file, self.font_size)
+        advance = max(1, int(round(self.font.getlength(char))))
+        # Drawn like ImageDraw.text draws a line, black on white into a 1 bit image. PIL rounds the vertical
+        # position of a string to its tallest glyph, the anchor keeps every glyph on the same baseline.
+        anchor = int(round(self.font.getlength(GLYPHS.ANCHOR)))
+        cell = Image.new('1', (anchor + advance, self.height), 'WHITE')
+        ImageDraw.Draw(cell).text((0, 0), GLYPHS.ANCHOR + char, font=self.font, fill=0)
+        cell = cell.crop((anchor, 0, anchor + advance, self.height))
+        # Transposed, every packed row is one glyph column with the top pixel in the MSB of the first byte
+        data = cell.transpose(Image.TRANSPOSE).tobytes()
+        row_bytes = (self.height + 7) // 8
+        columns = []
+        for x in range(advance):
+            bits = int.from_bytes(data[x * row_bytes:(x + 1) * row_bytes], 'big') >> (row_bytes * 8 - self.height)
+            ink = ~bits & ((1 << self.height) - 1)
+            columns.append(int('{:0{}b}'.format(ink, self.height)[::-1], 2))
+        self.glyphs[char] = columns
+        return columns
+
+    def glyph(self, char):
+        columns = self.glyphs.get(char)
+        if columns is None:
+            columns = self.rasterize(char)
+        return columns
+
+    def render(self, text, y, width, pages):
+        # Returns the page-packed bitmap of one text line drawn at row y as [(page, bytes as int)]
+        key = (text, y, width, pages)
+        line = self.lines.get(key)
+        if line is not None:
+            self.lines.move_to_end(key)
+            return line
+        columns = []
+        for char in text:
+            columns.extend(self.glyph(char))
+            if len(columns) >= width:
+                break
+        del columns[width:]
+        line = []
+        for page in range(pages):
+            shift = y - page * 8
+            if shift >= 0:
+                row = bytes((column << shift) & 0xff for column in columns)
+            else:
+                row = bytes((column >> -shift) & 0xff for column in columns)
+            if any(row):
+                line.append((page, int.from_bytes(row, 'little')))
+        self.lines[key] = line
+        if len(self.lines) > self.line_cache:
+            self.lines.popitem(last=False)
+        return line
@@ -33,6 +33,12 @@ import pprint
 from PIL import Image, ImageDraw, ImageFont
 from smbus import SMBus
 
+from SSD1306 import GLYPHS
+
+# Reverses the bit order of a byte and inverts it: PIL packs the topmost pixel into the MSB and uses 0 for the
+# black text we draw, the controller wants the topmost pixel in the LSB and 1 for a lit pixel
+PAGE_BYTE = bytes((~int('{:08b}'.format(i)[::-1], 2)) & 0xff for i in range(256))
+
 
 class SSD1306(object):
     WIDTH: int = 128
@@ -42,11 +48,21 @@ class SSD1306(object):
     FONT_SIZE: int = 15
     SMBUS_ADDR: int = 1
     ADDRESS: int = 0x3c
+    BLOCK_SIZE: int = 32  # SMBus block write limit
+    SCROLL_RIGHT: int = 0x26
+    SCROLL_LEFT: int = 0x27
+    SCROLL_OFF: int = 0x2E
+    SCROLL_ON: int = 0x2F
+    # Frames per scroll step -> the controller's time interval code
+    SCROLL_INTERVALS = {5: 0, 64: 1, 128: 2, 256: 3, 3: 4, 4: 5, 25: 6, 2: 7}
+    SCROLL_FRAMES: int = 4
+    MARQUEE_GAP: int = 2  # Blank characters between the end and the start of a scrolling line
 
     def __init__(self, width=WIDTH, height=HEIGHT, smbus_addr=SMBUS_ADDR, addr=ADDRESS,
                  text_width=TEXT_WIDTH, text_height=TEXT_HEIGHT, font_file='', font_size=FONT_SIZE):
         self.logger = logging.getLogger('mole')
-        self.logger.debug("Creating new OLED control with parameters: \n" + pprint.pformat(locals()))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Creating new OLED control with parameters: \n%s", pprint.pformat(locals()))
         self.width = width
         self.height = height
         self.text_width = text_width
@@ -58,21 +74,47 @@ class SSD1306(object):
         self.bus = SMBus(self.smbus_addr)
         self.image = Image.new('1', (self.width, self.height), "WHITE")
         self.draw = ImageDraw.Draw(self.image)
+        self.buffer = bytearray(self.Page * self.Column)
+        self.shown = None  # Copy of the last frame sent to the panel, None when unknown
+        self.transactions = 0  # I2C writes since start
+        self.scrolling = None  # (first page, last page) the controller scrolls, None when static
+        self.stale = set()  # Pages whose RAM a stopped scroll left shifted
+        self.marquee = None  # (line text, window) being scrolled
+        self.windows = {}  # Line text -> next window of a line too long for the panel
         self.font_size = font_size
+        self.glyphs = None
         if font_file != '':
             self.font = ImageFont.truetype(font_file, font_size)
             self.font_size = font_size
+            self.glyphs = GLYPHS.GLYPHS(font_file, font_size)
+        else:
+            self.font = ImageFont.load_default()
 
     def send_command(self, cmd):
+        self.transactions += 1
         self.bus.write_byte_data(self.addr, 0x00, cmd)
 
     def send_data(self, data):
+        self.transactions += 1
         self.bus.write_byte_data(self.addr, 0x40, data)
 
+    def send_commands(self, cmds):
+        self.transactions += 1
+        self.bus.write_i2c_block_data(self.addr, 0x00, cmds)
+
+    def send_data_block(self, data):
+        for i in range(0, len(data), SSD1306.BLOCK_SIZE):
+            self.transactions += 1
+            self.bus.write_i2c_block_data(self.addr, 0x40, list(data[i:i + SSD1306.BLOCK_SIZE]))
+
     def close_bus(self):
         self.bus.close()
 
     def init(self):
+        self.shown = None
+        self.scrolling = None
+        self.marquee = None
+        self.send_command(SSD1306.SCROLL_OFF)
         self.send_command(0xAE)
         self.send_command(0x40)  # set low column address
         self.send_command(0xB0)  # set high column address
@@ -98,53 +140,160 @@ class SSD1306(object):
         self.send_command(0xaf)
 
     def clear_buffer(self, color='WHITE'):
-        self.image = Image.new('1', (self.width, self.height), color)
-        self.draw = ImageDraw.Draw(self.image)
+        if self.image.size != (self.width, self.height):
+            self.image = Image.new('1', (self.width, self.height), color)
+            self.draw = ImageDraw.Draw(self.image)
+        else:
+            self.draw.rectangle((0, 0, self.width, self.height), fill=color)
+
+    def scroll(self, first, last, left=True, frames=SCROLL_FRAMES):
+        # Continuous horizontal scroll of pages first to last, the controller rotates them without any bus traffic
+        if self.scrolling is not None:
+            self.stop_scroll()
+        self.send_commands([SSD1306.SCROLL_LEFT if left else SSD1306.SCROLL_RIGHT, 0x00, first,
+                            SSD1306.SCROLL_INTERVALS[frames], last, 0x00, 0xFF, SSD1306.SCROLL_ON])
+        self.scrolling = (first, last)
+
+    def stop_scroll(self):
+        if self.scrolling is None:
+            return
+        self.send_command(SSD1306.SCROLL_OFF)
+        # The scroll shifted the RAM of these pages, they have to be rewritten
+        self.stale.update(range(self.scrolling[0], self.scrolling[1] + 1))
+        self.scrolling = None
+        self.marquee = None
 
     def clear(self, color='WHITE'):
+        self.stop_scroll()
         self.clear_buffer(color)
         self.show()
 
     def get_buffer(self):
-        buf = [0xff] * (self.Page * self.Column)
         image_monocolor = self.image.convert('1')
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if imwidth == self.width and imheight == self.height:
-            # print ("Horizontal screen")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[x + int(y / 8) * self.width] &= ~(1 << (y % 8))
-        elif imwidth == self.height and imheight == self.width:
-            # print ("Vertical screen")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    new_x = y
-                    new_y = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[(new_x + int(new_y / 8) * self.width)] &= ~(1 << (y % 8))
-        for x in range(self.Page * self.Column):
-            buf[x] = ~buf[x]
-        return buf
-
-    def show(self):
-        buffer = self.get_buffer()
+        if imwidth == self.height and imheight == self.width:
+            # Vertical screen: rotate it back to the panel orientation
+            image_monocolor = image_monocolor.transpose(Image.ROTATE_90)
+        elif imwidth != self.width or imheight != self.height:
+            self.buffer[:] = bytes(len(self.buffer))
+            return self.buffer
+        # After transposing every row of the packed image is one display column, with one byte per page
+        columns = image_monocolor.transpose(Image.TRANSPOSE).tobytes().translate(PAGE_BYTE)
+        for i in range(self.Page):
+            self.buffer[i * self.Column:(i + 1) * self.Column] = columns[i::self.Page]
+        return self.buffer
+
+    def show(self, buffer=None, skip=()):
+        # Pages in skip are left as they are, e.g. the ones scrolling
+        if buffer is None:
+            buffer = self.get_buffer()
         for i in range(0, self.Page):
-            self.send_command(0xB0 + i)  # set page address
-            self.send_command(0x00)  # set low column address
-            self.send_command(0x10)  # set high column address
-            # write data #
-            for j in range(0, self.Column):
-                self.send_data(buffer[j + self.width * i])
-
-    def print_buffer(self, page):
-        self.clear_buffer()
+            if i in skip:
+                continue
+            start = i * self.Column
+            page = buffer[start:start + self.Column]
+            first = 0
+            last = self.Column - 1
+            if self.shown is not None and i not in self.stale:
+                # XOR the page against what the panel already shows to find the changed column range
+                diff = int.from_bytes(page, 'little') ^ int.from_bytes(self.shown[start:start + self.Column], 'little')
+                if diff == 0:
+                    continue
+                first = ((diff & -diff).bit_length() - 1) // 8
+                last = (diff.bit_length() - 1) // 8
+            # set page address, low and high column address
+            self.send_commands([0xB0 + i, first & 0x0F, 0x10 | (first >> 4)])
+            self.send_data_block(page[first:last + 1])
+            self.stale.discard(i)
+        self.shown = bytearray(buffer)
+
+    def changed(self, buffer, skip=()):
+        # Whether show() would write any page not in skip
+        if self.shown is None:
+            return True
+        for i in range(self.Page):
+            if i in skip:
+                continue
+            if i in self.stale or buffer[i * self.Column:(i + 1) * self.Column] != \
+                    self.shown[i * self.Column:(i + 1) * self.Column]:
+                return True
+        return False
+
+    def window(self, text):
+        # The part of text shown while it scrolls, with room for the gap. A text too long for the panel is shown
+        # a window at a time, the next one every time it is uploaded again.
+        room = self.Column - self.MARQUEE_GAP * len(self.glyphs.glyph(' '))
+        windows = []
+        start = 0
+        columns = 0
+        for i, char in enumerate(text):
+            columns += len(self.glyphs.glyph(char))
+            if columns > room:
+                windows.append(text[start:i])
+                start = i
+                columns = len(self.glyphs.glyph(char))
+        windows.append(text[start:])
+        if len(windows) == 1:
+            return text
+        index = self.windows.get(text, 0) % len(windows)
+        if len(self.windows) >= self.glyphs.line_cache:
+            self.windows.clear()
+        self.windows[text] = index + 1
+        return windows[index]
+
+    def print_buffer(self, page, marquee=-1):
+        # marquee: the line that scrolls when it does not fit, -1 for none
+        if self.glyphs is None:
+            self.stop_scroll()
+            self.clear_buffer()
+            line_number = 0
+            for line in page:
+                self.draw.text((0, line_number * self.font_size), line, font=self.font, fill=0)
+                line_number += 1
+                if line_number >= self.height:
+                    break
+            self.show()
+            return
+        # Compose the frame straight from the pre-rasterized line bitmaps, one big int per page
+        pages = [0] * self.Page
+        ring = None
         line_number = 0
         for line in page:
-            self.draw.text((0, line_number * self.font_size), line, font=self.font, fill=0)
+            text = line.rstrip()
+            if line_number == marquee and len(text) > self.text_width:
+                if self.marquee is not None and self.marquee[0] == text:
+                    window = self.marquee[1]  # Still scrolling, the panel already has it
+                else:
+                    window = self.window(text)
+                ring = (text, window, self.glyphs.render(window, line_number * self.font_size, self.Column, self.Page))
+            else:
+                for i, bits in self.glyphs.render(line, line_number * self.font_size, self.Column, self.Page):
+                    pages[i] |= bits
             line_number += 1
             if line_number >= self.height:
                 break
-        self.show()
+        scroll = None
+        if ring is not None:
+            text, window, bitmap = ring
+            scrolled = [i for i, bits in bitmap]
+            # The controller scrolls whole pages, a page shared with a static line stays static
+            if scrolled and not any(pages[i] for i in range(scrolled[0], scrolled[-1] + 1)):
+                scroll = (scrolled[0], scrolled[-1])
+            for i, bits in bitmap:
+                pages[i] |= bits
+        for i in range(self.Page):
+            self.buffer[i * self.Column:(i + 1) * self.Column] = pages[i].to_bytes(self.Column, 'little')
+        if scroll is not None and scroll == self.scrolling and self.marquee == (text, window):
+            skip = range(scroll[0], scroll[1] + 1)
+            if self.changed(self.buffer, skip):
+                # No RAM access while scrolling: pause, write the static pages, resume where the ring stands
+                self.send_command(SSD1306.SCROLL_OFF)
+                self.scrolling = None
+                self.show(self.buffer, skip)
+                self.scroll(scroll[0], scroll[1])
+            return
+        self.stop_scroll()
+        self.show(self.buffer)
+        if scroll is not None:
+            self.scroll(scroll[0], scroll[1])
+            self.marquee = (text, window)
@@ -0,0 +1,284 @@
+#!/usr/bin/python
+
+import getopt
+import multiprocessing
+import os
+import resource
+import selectors
+import struct
+import sys
+import time
+
+DIR_PATH: str = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIR_PATH))
+
+import fakes  # noqa: E402
+
+fakes.install()
+
+import decoder  # noqa: E402
+import mole  # noqa: E402
+import traffic  # noqa: E402
+from capture import SOL_PACKET, RawCapture  # noqa: E402
+from neighbors import FrameCache, NeighborTable  # noqa: E402
+from pager import NeighborPages, Pager  # noqa: E402
+from pcapfile import PcapReader  # noqa: E402
+from tshark import TsharkCapture  # noqa: E402
+
+try:
+    import pyshark
+except ImportError:
+    pyshark = None
+
+HELP: str = DIR_PATH + '/decode.py -h | [-b decode|mole|uncached|tshark|pyshark] [-n <neighbors>] [-l <lldp share>] ' \
+                       '[-m minimal|full|bulky] [-c <frames>] [-r <frames/s>] [-p <file.pcap>] ' \
+                       '[-i <capture iface> -s <send iface>]'
+BACKENDS = ('decode', 'mole', 'uncached', 'tshark', 'pyshark')
+PACKET_STATISTICS: int = 6
+DRAIN_TIMEOUT: float = 0.5  # Seconds without frames after the sender finished before a live run ends
+
+
+class Stats(object):
+    # Decode latency of every frame, plus CPU time and wall time of the run
+    def __init__(self):
+        self.latencies = []
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.sent = 0
+        self.kernel_drops = 0
+
+    def start(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def stop(self):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+
+    def report(self, name):
+        received = len(self.latencies)
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6 if latencies else 0.0
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        with open('/proc/self/statm') as file_object:
+            rss = int(file_object.read().split()[1]) * page_size // 1024
+        print('%-8s %9d frames %10.0f fps  p50 %7.1f us  p90 %7.1f us  p99 %7.1f us  max %8.1f us' % (
+            name, received, received / self.wall if self.wall > 0 else 0.0, percentile(0.5), percentile(0.9),
+            percentile(0.99), percentile(1.0)))
+        if self.sent > 0:
+            dropped = self.sent - received
+            print('%-8s %9d sent, %d dropped (%.2f%%), %d dropped by the kernel' % (
+                '', self.sent, dropped, 100.0 * dropped / self.sent, self.kernel_drops))
+        cpu = 100.0 * self.cpu / self.wall if self.wall > 0 else 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print('%-8s CPU %.0f%%, RSS %d KiB, peak %d KiB' % ('', cpu, rss, peak))
+
+
+def handler(backend, interface):
+    # The per frame work of a backend
+    if backend == 'decode':
+        return lambda frame: decoder.decode(frame, interface)
+    # Everything mole does for a frame short of the displays: frame cache, filter, neighbor table and pager pages.
+    # uncached is the same without the frame cache, every frame is decoded.
+    mole.has_buzzer = mole.has_lcd = mole.has_oled = False
+    mole.capability = 0
+    mole.cap_interfaces = [interface]
+    mole.neighbors = NeighborTable(1 << 20)
+    mole.frame_cache = FrameCache(mole.neighbors, 1 << 20) if backend == 'mole' else None
+    mole.pager = Pager(16, 2, 1)
+    mole.neighbor_pages = NeighborPages(mole.neighbors, 16, 2, mole.neighbor_lines, mole.NEIGHBOR_LINES, [interface])
+    mole.pager.set_source(mole.neighbor_pages)
+    return lambda frame: mole.print_frame_info(frame, interface)
+
+
+def run_frames(backend, frames):
+    process = handler(backend, 'bench')
+    stats = Stats()
+    clock = time.perf_counter
+    stats.start()
+    for frame in frames:
+        start = clock()
+        process(frame)
+        stats.latencies.append(clock() - start)
+    stats.stop()
+    return stats
+
+
+def run_pyshark(path):
+    # tshark dissects the file, the timing covers the dissection and the mapping to a Neighbor
+    stats = Stats()
+    capture = pyshark.FileCapture(path, display_filter='cdp or lldp', keep_packets=False)
+    clock = time.perf_counter
+    stats.start()
+    packets = iter(capture)
+    while True:
+        start = clock()
+        try:
+            packet = next(packets)
+        except StopIteration:
+            break
+        decoder.from_pyshark(packet)
+        stats.latencies.append(clock() - start)
+    stats.stop()
+    capture.close()
+    return stats
+
+
+def check_tshark_command():
+    # A live capture on several interfaces must filter every one of them, not only the last
+    command = TsharkCapture(['eth0', 'eth1'], mole.CDP_FILTER).command()
+    for i, arg in enumerate(command):
+        if arg == '-i' and command[i + 2:i + 4] != ['-f', mole.CDP_FILTER]:
+            print('tshark command leaves ' + command[i + 1] + ' unfiltered: ' + ' '.join(command), file=sys.stderr)
+            sys.exit(1)
+
+
+def run_tshark(path):
+    # tshark dissects the file into the neighbor fields, the timing covers the parsing of its output
+    check_tshark_command()
+    stats = Stats()
+    capture = TsharkCapture(path=path)
+    capture.start()
+    selector = selectors.DefaultSelector()
+    selector.register(capture.fileno(), selectors.EVENT_READ)
+    clock = time.perf_counter
+    stats.start()
+    while True:
+        selector.select()
+        start = clock()
+        neighbors = capture.read()
+        if neighbors is None:
+            break
+        if neighbors:
+            latency = (clock() - start) / len(neighbors)
+            stats.latencies.extend([latency] * len(neighbors))
+    stats.stop()
+    for message in capture.messages():
+        print('tshark: ' + message, file=sys.stderr)
+    capture.stop()
+    return stats
+
+
+def sender(interface, frames, rate, result):
+    result.value = traffic.send(interface, frames, rate)
+
+
+def run_live(backend, interface, send_interface, frames, rate):
+    # The sender runs in its own process so it does not compete for the interpreter lock
+    capture = RawCapture(interface)
+    capture.open()
+    capture.setblocking(False)
+    process = handler(backend, interface)
+    sent = multiprocessing.Value('l', 0)
+    worker = multiprocessing.Process(target=sender, args=(send_interface, frames, rate, sent))
+    selector = selectors.DefaultSelector()
+    selector.register(capture.sock, selectors.EVENT_READ)
+    stats = Stats()
+    clock = time.perf_counter
+    worker.start()
+    stats.start()
+    idle_since = None
+    last = None
+    while True:
+        if not selector.select(0.05):
+            if worker.is_alive():
+                continue
+            if idle_since is None:
+                idle_since = clock()
+            elif clock() - idle_since > DRAIN_TIMEOUT:
+                break
+            continue
+        idle_since = None
+        for frame in capture.recv_batch():
+            start = clock()
+            process(frame)
+            stats.latencies.append(clock() - start)
+        last = clock()
+    stats.stop()
+    if last is not None:
+        # Up to the last frame, the wait for stragglers does not count
+        stats.wall = last - stats._wall
+    worker.join()
+    stats.sent = sent.value
+    # struct tpacket_stats: packets, drops
+    stats.kernel_drops = struct.unpack('II', capture.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))[1]
+    capture.close()
+    return stats
+
+
+def main(argv):
+    backends = []
+    count_neighbors = 100
+    lldp_share = 0.5
+    mix = 'full'
+    count = 100000
+    rate = 0.0
+    path = None
+    interface = None
+    send_interface = None
+    try:
+        opts, args = getopt.getopt(argv, "b:c:hi:l:m:n:p:r:s:", ["backend=", "count=", "iface=", "lldp=", "mix=",
+                                                                 "neighbors=", "pcap=", "rate=", "send="])
+    except getopt.GetoptError:
+        print(HELP)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(HELP)
+            sys.exit()
+        elif opt in ("-b", "--backend"):
+            backends.append(arg)
+        elif opt in ("-c", "--count"):
+            count = int(arg)
+        elif opt in ("-i", "--iface"):
+            interface = arg
+        elif opt in ("-l", "--lldp"):
+            lldp_share = float(arg)
+        elif opt in ("-m", "--mix"):
+            mix = arg
+        elif opt in ("-n", "--neighbors"):
+            count_neighbors = int(arg)
+        elif opt in ("-p", "--pcap"):
+            path = arg
+        elif opt in ("-r", "--rate"):
+            rate = float(arg)
+        elif opt in ("-s", "--send"):
+            send_interface = arg
+    if not backends:
+        backends = ['decode', 'mole', 'uncached']
+    if [backend for backend in backends if backend not in BACKENDS] or (interface is None) != (send_interface is None):
+        print(HELP)
+        sys.exit(2)
+
+    if path is not None:
+        # Only the frames the capture filter would let through, like the kernel does live
+        reader = PcapReader(path)
+        reader.open()
+        frames = [frame for interface_name, timestamp, frame in reader.frames()]
+        reader.close()
+    else:
+        frames = traffic.frames(traffic.neighbors(count_neighbors, lldp_share), count, mix)
+    for backend in backends:
+        if backend == 'pyshark':
+            if pyshark is None or path is None:
+                print('pyshark: needs pyshark and a pcap file (-p)')
+                continue
+            stats = run_pyshark(path)
+        elif backend == 'tshark':
+            if not TsharkCapture.available() or path is None:
+                print('tshark: needs tshark and a pcap file (-p)')
+                continue
+            stats = run_tshark(path)
+        elif interface is not None:
+            stats = run_live(backend, interface, send_interface, frames, rate)
+        else:
+            stats = run_frames(backend, frames)
+        stats.report(backend)
+        if backend == 'mole':
+            print('%-8s frame cache %d hits, %d misses' % ('', mole.frame_cache.hits, mole.frame_cache.misses))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,99 @@
+import sys
+import types
+
+I2C_CLOCK: int = 400000       # Fast mode I2C
+GPIO_CALL: float = 1.5e-6     # RPi.GPIO output() on a Pi 3/4
+
+
+class Recorder(object):
+    # Every bus transaction of the fakes, with the time it would take on the real bus
+    def __init__(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.bus_time = 0.0
+        self.log = None  # List of transactions when logging
+
+    def reset(self, log=False):
+        self.transactions = 0
+        self.bytes = 0
+        self.bus_time = 0.0
+        self.log = [] if log else None
+
+    def i2c(self, addr, register, data):
+        # START, address, register, data bytes and STOP, 9 clocks a byte
+        self.transactions += 1
+        self.bytes += len(data)
+        self.bus_time += ((2 + len(data)) * 9 + 2) / I2C_CLOCK
+        if self.log is not None:
+            self.log.append(('i2c', addr, register, bytes(data)))
+
+    def gpio(self, channels, values):
+        self.transactions += 1
+        self.bytes += len(channels)
+        self.bus_time += GPIO_CALL
+        if self.log is not None:
+            self.log.append(('gpio', tuple(channels), tuple(values)))
+
+
+recorder = Recorder()
+
+
+class SMBus(object):
+    def __init__(self, bus=None):
+        self.bus = bus
+
+    def write_byte_data(self, addr, register, value):
+        recorder.i2c(addr, register, [value])
+
+    def write_i2c_block_data(self, addr, register, data):
+        recorder.i2c(addr, register, data)
+
+    def write_byte(self, addr, value):
+        recorder.i2c(addr, value, [])
+
+    def read_byte(self, addr):
+        recorder.i2c(addr, None, [0])
+        return 0
+
+    def read_byte_data(self, addr, register):
+        recorder.i2c(addr, register, [0])
+        return 0
+
+    def close(self):
+        pass
+
+
+def _gpio_module():
+    gpio = types.ModuleType('RPi.GPIO')
+    gpio.BCM = 11
+    gpio.BOARD = 10
+    gpio.OUT = 0
+    gpio.IN = 1
+    gpio.HIGH = 1
+    gpio.LOW = 0
+    gpio.setwarnings = lambda flag: None
+    gpio.setmode = lambda mode: None
+    gpio.setup = lambda channel, direction, **kwargs: None
+    gpio.cleanup = lambda *args: None
+    gpio.input = lambda channel: 0
+
+    def output(channel, value):
+        if isinstance(channel, (list, tuple)):
+            if not isinstance(value, (list, tuple)):
+                value = [value] * len(channel)
+            recorder.gpio(channel, value)
+        else:
+            recorder.gpio([channel], [value])
+    gpio.output = output
+    return gpio
+
+
+def install():
+    # Replaces smbus and RPi.GPIO for everything imported afterwards
+    smbus = types.ModuleType('smbus')
+    smbus.SMBus = SMBus
+    rpi = types.ModuleType('RPi')
+    rpi.GPIO = _gpio_module()
+    sys.modules['smbus'] = smbus
+    sys.modules['RPi'] = rpi
+    sys.modules['RPi.GPIO'] = rpi.GPIO
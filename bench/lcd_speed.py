@@ -0,0 +1,76 @@
+#!/usr/bin/python
+
+import configparser
+import getopt
+import os
+import sys
+import time
+
+DIR_PATH: str = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIR_PATH))
+
+from LCD1602 import LCD1602  # noqa: E402
+from LCD1602 import TIMING  # noqa: E402
+
+HELP: str = DIR_PATH + '/lcd_speed.py -h | -c <config> -n <frames>'
+LEGACY_DELAY: float = 0.0005
+
+
+def run(lcd, frames):
+    # Alternate two pages that differ in every cell so the shadow buffer cannot skip anything
+    pages = [[chr(0x41 + (i + line) % 26) * lcd.LCD_WIDTH for line in range(lcd.LCD_HEIGHT)] for i in range(2)]
+    start = time.perf_counter()
+    for i in range(frames):
+        lcd.print_buffer(pages[i % 2])
+    elapsed = time.perf_counter() - start
+    return frames * lcd.LCD_WIDTH * lcd.LCD_HEIGHT / elapsed
+
+
+def main(argv):
+    config_file = os.path.dirname(DIR_PATH) + '/mole.ini'
+    frames = 20
+    try:
+        opts, args = getopt.getopt(argv, "c:hn:", ["config=", "frames="])
+    except getopt.GetoptError:
+        print(HELP)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(HELP)
+            sys.exit()
+        elif opt in ("-c", "--config"):
+            config_file = arg
+        elif opt in ("-n", "--frames"):
+            frames = int(arg)
+
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    width = config.getint('LCD', 'width', fallback=LCD1602.LCD1602.WIDTH)
+    height = config.getint('LCD', 'height', fallback=LCD1602.LCD1602.HEIGHT)
+    pins = [config.getint('LCD', 'LCD_RS', fallback=LCD1602.LCD1602.RS),
+            config.getint('LCD', 'LCD_E', fallback=LCD1602.LCD1602.E),
+            config.getint('LCD', 'LCD_D4', fallback=LCD1602.LCD1602.D4),
+            config.getint('LCD', 'LCD_D5', fallback=LCD1602.LCD1602.D5),
+            config.getint('LCD', 'LCD_D6', fallback=LCD1602.LCD1602.D6),
+            config.getint('LCD', 'LCD_D7', fallback=LCD1602.LCD1602.D7)]
+    low_pins = [config.getint('LCD', 'LCD_D' + str(i), fallback=None) for i in range(4)]
+    addrs = []
+    for i in range(height):
+        addr = int(config.get('LCD', 'line_' + str(i) + '_addr', fallback='0'), base=16)
+        if addr == 0:
+            addr = LCD1602.LCD1602.ADDRS[i]
+        addrs.insert(i, addr)
+
+    modes = [('4-bit', [None] * 4)]
+    if None not in low_pins:
+        modes.append(('8-bit', low_pins))
+    for name, data_pins in modes:
+        for timing_name, timing in (('legacy', TIMING.TIMING(fixed=LEGACY_DELAY)), ('calibrated', TIMING.TIMING())):
+            lcd = LCD1602.LCD1602(width, height, *pins, addrs, *data_pins, timing=timing)
+            lcd.init()
+            print('%s %-10s %8.1f chars/s' % (name, timing_name, run(lcd, frames)))
+    lcd.finish()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
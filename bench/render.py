@@ -0,0 +1,243 @@
+#!/usr/bin/python
+
+import asyncio
+import getopt
+import json
+import os
+import platform
+import sys
+import time
+
+DIR_PATH: str = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIR_PATH))
+
+import fakes  # noqa: E402
+
+fakes.install()
+
+import mole  # noqa: E402
+from LCD1602 import LCD1602  # noqa: E402
+from LCD1602 import PCF8574  # noqa: E402
+from neighbors import NeighborTable  # noqa: E402
+from pager import NeighborPages, Pager  # noqa: E402
+from SSD1306 import SSD1306  # noqa: E402
+
+HELP: str = DIR_PATH + '/render.py -h | [-n <frames>] [-o <results.json>] [-b <baseline.json>] [-t <tolerance>]'
+FONT: str = os.path.dirname(DIR_PATH) + '/fonts/Courier_New.ttf'
+TOLERANCE: float = 0.25
+REPEAT: int = 5  # Wall time is the best of this many rounds
+
+# (name, pixel width, pixel height, text width, text height)
+OLED_PANELS = [('oled128x32', 128, 32, 16, 2), ('oled128x64', 128, 64, 16, 4)]
+# (name, width, height, 8-bit bus)
+LCD_PANELS = [('lcd16x2', 16, 2, False), ('lcd16x2-8bit', 16, 2, True), ('lcd20x4', 20, 4, False)]
+# (name, width, height) behind a PCF8574 I2C backpack
+I2C_LCD_PANELS = [('lcd16x2-i2c', 16, 2), ('lcd20x4-i2c', 20, 4)]
+
+
+def contents(kind, width, height, frame):
+    # full: every cell changes, tick: one character changes, same: nothing changes
+    if kind == 'full':
+        return [chr(0x41 + (frame + line) % 26) * width for line in range(height)]
+    lines = ['SW-CORE-%02d' % line for line in range(height)]
+    if kind == 'tick':
+        lines[-1] = 'Gi1/0/%d' % (frame % 10)
+    return [line.ljust(width) for line in lines]
+
+
+def report(name, frames, wall):
+    # Per frame figures of the bus traffic recorded since the last reset
+    result = dict(name=name, frames=frames,
+                  transactions=fakes.recorder.transactions / frames,
+                  bytes=fakes.recorder.bytes / frames,
+                  wall_us=wall / frames * 1e6,
+                  bus_us=fakes.recorder.bus_time / frames * 1e6)
+    print('%-40s %8.1f %8.1f %10.1f %10.1f' % (name, result['transactions'], result['bytes'], result['wall_us'],
+                                               result['bus_us']))
+    return result
+
+
+def measure(name, frames, step):
+    # Runs step(frame) for every frame, the first call only primes caches and shadow buffers
+    step(-1)
+    best = None
+    for i in range(REPEAT):
+        fakes.recorder.reset()
+        start = time.perf_counter()
+        for frame in range(frames):
+            step(frame)
+        wall = time.perf_counter() - start
+        if best is None or wall < best:
+            best = wall
+    return report(name, frames, best)
+
+
+def oled_cases(frames):
+    results = []
+    for panel, width, height, text_width, text_height in OLED_PANELS:
+        font_size = height // text_height
+        oled = SSD1306.SSD1306(width, height, 1, SSD1306.SSD1306.ADDRESS, text_width, text_height, FONT, font_size)
+        oled.init()
+        oled.draw.text((0, 0), contents('full', text_width, text_height, 0)[0], font=oled.font, fill=0)
+        results.append(measure(panel + ' get_buffer', frames, lambda frame: oled.get_buffer()))
+        buffers = [bytearray(b'\x55' * len(oled.buffer)), bytearray(b'\xaa' * len(oled.buffer))]
+        results.append(measure(panel + ' show full', frames, lambda frame: oled.show(buffers[frame % 2])))
+        for kind in ('full', 'tick', 'same'):
+            results.append(measure(panel + ' print_buffer ' + kind, frames, lambda frame: oled.print_buffer(
+                contents(kind, text_width, text_height, frame))))
+        # A line too long for the panel, the controller scrolls it after the first upload
+        lines = contents('same', text_width, text_height, 0)
+        lines[-1] = 'cisco WS-C2960X-48FPD-L (Cisco IOS Software, C2960X Software, Version 15.2(7)E4)'
+        results.append(measure(panel + ' print_buffer marquee', frames, lambda frame: oled.print_buffer(
+            lines, text_height - 1)))
+    return results
+
+
+def gpio_lcd(width, height, eight_bit):
+    low_pins = [5, 6, 12, 13] if eight_bit else [None] * 4
+    return LCD1602.LCD1602(width, height, LCD1602.LCD1602.RS, LCD1602.LCD1602.E, LCD1602.LCD1602.D4,
+                           LCD1602.LCD1602.D5, LCD1602.LCD1602.D6, LCD1602.LCD1602.D7, LCD1602.LCD1602.ADDRS,
+                           *low_pins)
+
+
+def lcd_cases(frames):
+    results = []
+    for panel, width, height, eight_bit in LCD_PANELS:
+        lcd = gpio_lcd(width, height, eight_bit)
+        lcd.init()
+        for kind in ('full', 'tick', 'same'):
+            results.append(measure(panel + ' print_buffer ' + kind, frames, lambda frame: lcd.print_buffer(
+                contents(kind, width, height, frame))))
+    for panel, width, height in I2C_LCD_PANELS:
+        lcd = PCF8574.PCF8574(width, height)
+        lcd.init()
+        for kind in ('full', 'tick', 'same'):
+            results.append(measure(panel + ' print_buffer ' + kind, frames, lambda frame: lcd.print_buffer(
+                contents(kind, width, height, frame))))
+    return results
+
+
+async def pager_ticks(name, frames):
+    # A page change through the running pager_run task, timed until the frame is on both displays.
+    # Thread hand-offs make single ticks noisy, the median tick stands for all of them.
+    mole.loop = asyncio.get_running_loop()
+    mole.page_interval = 3600.0
+    drawn = asyncio.Event()
+    expected = []
+
+    def sink_done(frame):
+        if all(sink.last is not None and sink.last.lines == expected for sink in mole.sinks):
+            mole.loop.call_soon_threadsafe(drawn.set)
+    for sink in mole.sinks:
+        sink.listener = sink_done
+        sink.start()
+    task = mole.loop.create_task(mole.pager_run())
+    results = []
+    for kind in ('full', 'tick'):
+        step_frames = [contents(kind, mole.pager.width, mole.pager.height, frame) for frame in range(-1, frames)]
+        await asyncio.sleep(0)
+        fakes.recorder.reset()
+        ticks = []
+        for frame, lines in enumerate(step_frames):
+            drawn.clear()
+            expected[:] = [text.ljust(mole.pager.width) for text in lines]
+            start = time.perf_counter()
+            for line, text in enumerate(lines):
+                mole.pager.set_line(0, line, text)
+            await drawn.wait()
+            if frame == 0:
+                fakes.recorder.reset()  # The first frame only primes the displays
+            else:
+                ticks.append(time.perf_counter() - start)
+        ticks.sort()
+        results.append(report('pager ' + name + ' ' + kind, frames, ticks[len(ticks) // 2] * frames))
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    for sink in mole.sinks:
+        sink.stop()
+    return results
+
+
+def pager_cases(frames):
+    # Every OLED panel next to every LCD, the pager text is as large as the larger of the two like in mole.main
+    lcds = [(panel, width, height, lambda width, height, eight_bit=eight_bit: gpio_lcd(width, height, eight_bit))
+            for panel, width, height, eight_bit in LCD_PANELS]
+    lcds += [(panel, width, height, PCF8574.PCF8574) for panel, width, height in I2C_LCD_PANELS]
+    results = []
+    for oled_panel, oled_width, oled_height, text_width, text_height in OLED_PANELS:
+        for lcd_panel, lcd_width, lcd_height, make_lcd in lcds:
+            mole.has_oled = True
+            mole.oled = SSD1306.SSD1306(oled_width, oled_height, 1, SSD1306.SSD1306.ADDRESS, text_width, text_height,
+                                        FONT, oled_height // text_height)
+            mole.oled.init()
+            mole.has_lcd = True
+            mole.lcd = make_lcd(lcd_width, lcd_height)
+            mole.lcd.init()
+            mole.sinks = [mole.DisplaySink('oled', mole.draw_oled), mole.DisplaySink('lcd', mole.draw_lcd)]
+            width = max(text_width, lcd_width)
+            height = max(text_height, lcd_height)
+            mole.neighbors = NeighborTable()
+            mole.pager = Pager(width, height, 1)
+            mole.neighbor_pages = NeighborPages(mole.neighbors, width, height, mole.neighbor_lines,
+                                                mole.NEIGHBOR_LINES)
+            mole.pager.set_source(mole.neighbor_pages)
+            results += asyncio.run(pager_ticks(oled_panel + '+' + lcd_panel, frames))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Regressions: more bus traffic than the baseline, or wall time beyond the tolerance
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        if result['transactions'] > before['transactions'] or result['bytes'] > before['bytes']:
+            regressions.append('%s: %.1f transactions, %.1f bytes per frame, was %.1f, %.1f' % (
+                result['name'], result['transactions'], result['bytes'], before['transactions'], before['bytes']))
+        if result['wall_us'] > before['wall_us'] * (1 + tolerance):
+            regressions.append('%s: %.1f us per frame, was %.1f us' % (result['name'], result['wall_us'],
+                                                                       before['wall_us']))
+    return regressions
+
+
+def main(argv):
+    frames = 50
+    output = DIR_PATH + '/render_results.json'
+    baseline_file = None
+    tolerance = TOLERANCE
+    try:
+        opts, args = getopt.getopt(argv, "b:hn:o:t:", ["baseline=", "frames=", "output=", "tolerance="])
+    except getopt.GetoptError:
+        print(HELP)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(HELP)
+            sys.exit()
+        elif opt in ("-b", "--baseline"):
+            baseline_file = arg
+        elif opt in ("-n", "--frames"):
+            frames = int(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-t", "--tolerance"):
+            tolerance = float(arg)
+
+    print('%-40s %8s %8s %10s %10s' % ('case', 'xfers', 'bytes', 'wall us', 'bus us'))
+    results = oled_cases(frames) + lcd_cases(frames) + pager_cases(frames)
+    with open(output, 'w') as file_object:
+        json.dump(dict(time=time.strftime('%Y-%m-%dT%H:%M:%S%z'), machine=platform.machine(),
+                       python=platform.python_version(), results=results), file_object, indent=2)
+    if baseline_file is not None:
+        with open(baseline_file) as file_object:
+            regressions = compare(results, json.load(file_object), tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
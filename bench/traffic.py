@@ -0,0 +1,233 @@
+#!/usr/bin/python
+
+import getopt
+import os
+import random
+import socket
+import struct
+import sys
+import time
+
+DIR_PATH: str = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(DIR_PATH))
+
+import decoder  # noqa: E402
+from decoder import Neighbor  # noqa: E402
+
+HELP: str = DIR_PATH + '/traffic.py -h | [-n <neighbors>] [-l <lldp share>] [-m minimal|full|bulky] ' \
+                       '[-N <noise frames per neighbor frame>] [-c <frames>] [-r <frames/s>] ' \
+                       '(-o <file.pcap> | -i <iface>)'
+MIXES = ('minimal', 'full', 'bulky')
+LLDP_DST: bytes = b'\x01\x80\xc2\x00\x00\x0e'
+PLATFORMS = [('cisco WS-C2960X-48FPD-L', 'Cisco IOS Software, C2960X Software, Version 15.2(7)E4'),
+             ('cisco C9300-48P', 'Cisco IOS Software [Cupertino], Version 17.9.4'),
+             ('Cisco IP Phone 8845', 'sip8845_65.14-1-1SR1-1')]
+MODELS = ['Polycom VVX 411', 'Yealink T54W', 'Aruba AP-515', 'HPE 5130-24G']
+# CDP TLVs the decoder skips but real switches send, used to make frames as big as real ones
+CDP_EXTRA = [(0x0009, b'CORP-VTP'), (0x000b, b'\x01'), (0x0010, struct.pack('!H', 15400)),
+             (0x0012, b'\x00'), (0x0013, b'\x00'), (0x001a, bytes(12))]
+
+
+def neighbors(count, lldp_share=0.5, seed=1):
+    # Repeatable set of switches and phones, every one with its own port
+    rng = random.Random(seed)
+    result = []
+    for i in range(count):
+        protocol = 'LLDP' if rng.random() < lldp_share else 'CDP'
+        ip = '10.%d.%d.%d' % (i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)
+        if i % 4 == 0:
+            platform, software = PLATFORMS[i % 2]
+            neighbor = Neighbor(protocol, 'sw-access-%04d.corp.example' % i, 'GigabitEthernet1/0/%d' % (i % 48 + 1),
+                                str(1 + i % 4094), platform, software, ip=ip, capabilities=0x28 if protocol == 'CDP'
+                                else 0x0014)
+        else:
+            platform, software = PLATFORMS[2]
+            mac = '%012x' % (0x00a0c0000000 + i)
+            neighbor = Neighbor(protocol, 'SEP' + mac.upper(), 'Port 1', str(100 + i % 100), platform, software,
+                                MODELS[i % len(MODELS)], 'FCH%08d' % i, ip,
+                                capabilities=0x490 if protocol == 'CDP' else 0x0024)
+        # Only what the protocol can carry, so the decoder gives back exactly this neighbor
+        if protocol == 'CDP':
+            neighbor.model = neighbor.serial = ''
+            neighbor.ttl = decoder.CDP_DEFAULT_TTL
+        else:
+            neighbor.platform = neighbor.software = ''
+            neighbor.ttl = decoder.LLDP_DEFAULT_TTL
+        result.append(neighbor)
+    return result
+
+
+def _cdp_tlv(tlv_type, value):
+    return struct.pack('!HH', tlv_type, len(value) + 4) + value
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+def cdp_frame(neighbor, source, mix='full'):
+    tlvs = _cdp_tlv(decoder.CDP_DEVICE_ID, neighbor.device_id.encode())
+    tlvs += _cdp_tlv(decoder.CDP_PORT_ID, neighbor.port.encode())
+    tlvs += _cdp_tlv(decoder.CDP_CAPABILITIES, struct.pack('!I', neighbor.capabilities))
+    if mix != 'minimal':
+        address = b'\x01\x01\xcc' + struct.pack('!H', 4) + socket.inet_aton(neighbor.ip)
+        tlvs += _cdp_tlv(decoder.CDP_ADDRESSES, struct.pack('!I', 1) + address)
+        tlvs += _cdp_tlv(decoder.CDP_SOFTWARE_VERSION, neighbor.software.encode())
+        tlvs += _cdp_tlv(decoder.CDP_PLATFORM, neighbor.platform.encode())
+        tlvs += _cdp_tlv(decoder.CDP_NATIVE_VLAN, struct.pack('!H', int(neighbor.vlan)))
+    if mix == 'bulky':
+        for tlv_type, value in CDP_EXTRA:
+            tlvs += _cdp_tlv(tlv_type, value)
+        tlvs += _cdp_tlv(decoder.CDP_MANAGEMENT_ADDRESSES, struct.pack('!I', 1) + address)
+    header = struct.pack('!BBH', 2, neighbor.ttl, 0)
+    payload = header[:2] + struct.pack('!H', _checksum(header + tlvs)) + tlvs
+    llc = b'\xaa\xaa\x03\x00\x00\x0c\x20\x00' + payload
+    return decoder.CDP_DST + source + struct.pack('!H', len(llc)) + llc
+
+
+def _lldp_tlv(tlv_type, value):
+    return struct.pack('!H', (tlv_type << 9) | len(value)) + value
+
+
+def lldp_frame(neighbor, source, mix='full'):
+    tlvs = _lldp_tlv(decoder.LLDP_CHASSIS_ID, b'\x04' + source)
+    tlvs += _lldp_tlv(decoder.LLDP_PORT_ID, b'\x05' + neighbor.port.encode())
+    tlvs += _lldp_tlv(decoder.LLDP_TTL, struct.pack('!H', neighbor.ttl))
+    tlvs += _lldp_tlv(decoder.LLDP_SYSTEM_NAME, neighbor.device_id.encode())
+    tlvs += _lldp_tlv(decoder.LLDP_SYSTEM_CAPABILITIES, struct.pack('!HH', neighbor.capabilities,
+                                                                    neighbor.capabilities))
+    if mix != 'minimal':
+        tlvs += _lldp_tlv(decoder.LLDP_MANAGEMENT_ADDRESS, b'\x05\x01' + socket.inet_aton(neighbor.ip) +
+                          b'\x02\x00\x00\x00\x01\x00')
+        policy = (int(neighbor.vlan) & 0x0fff) << 9 | 5 << 6 | 46
+        med = decoder.LLDP_MED_OUI
+        tlvs += _lldp_tlv(decoder.LLDP_ORGANIZATION, med + bytes([decoder.LLDP_MED_NETWORK_POLICY, 1]) +
+                          struct.pack('!I', policy)[1:])
+        if neighbor.serial != '':
+            tlvs += _lldp_tlv(decoder.LLDP_ORGANIZATION, med + bytes([decoder.LLDP_MED_SERIAL_NUMBER]) +
+                              neighbor.serial.encode())
+            tlvs += _lldp_tlv(decoder.LLDP_ORGANIZATION, med + bytes([decoder.LLDP_MED_MODEL_NAME]) +
+                              neighbor.model.encode())
+    if mix == 'bulky':
+        # Port and system description, ignored by the decoder
+        tlvs += _lldp_tlv(4, neighbor.port.encode() + b' - access port, building 2 floor 3')
+        tlvs += _lldp_tlv(6, PLATFORMS[0][1].encode())
+    tlvs += _lldp_tlv(decoder.LLDP_END, b'')
+    return LLDP_DST + source + struct.pack('!H', decoder.LLDP_ETHERTYPE) + tlvs
+
+
+def noise_frame(rng):
+    # Unicast IPv4 of a typical size, dropped by the capture filter
+    size = rng.choice((60, 60, 590, 1514))
+    return bytes.fromhex('00a0c0ffee01') + bytes.fromhex('00a0c0ffee02') + b'\x08\x00' + bytes(size - 14)
+
+
+def frames(neighbor_list, count, mix='full', noise=0, seed=1):
+    # count neighbor frames, cycling through the neighbors, with noise unrelated frames after each of them
+    rng = random.Random(seed)
+    encoded = []
+    for i, neighbor in enumerate(neighbor_list):
+        source = struct.pack('!HI', 0x00a0, 0xc0000000 + i)
+        if neighbor.protocol == 'CDP':
+            encoded.append(cdp_frame(neighbor, source, mix))
+        else:
+            encoded.append(lldp_frame(neighbor, source, mix))
+    noise_frames = [noise_frame(rng) for i in range(16)] if noise > 0 else []
+    result = []
+    for i in range(count):
+        result.append(encoded[i % len(encoded)])
+        for j in range(noise):
+            result.append(noise_frames[(i + j) % len(noise_frames)])
+    return result
+
+
+def write_pcap(path, frame_list, rate=0.0):
+    # Classic pcap, frames rate per second apart (1 us apart when rate is 0)
+    interval = 1.0 / rate if rate > 0 else 1e-6
+    start = time.time()
+    with open(path, 'wb') as file_object:
+        file_object.write(struct.pack('=IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 0x40000, 1))
+        for i, frame in enumerate(frame_list):
+            timestamp = start + i * interval
+            seconds = int(timestamp)
+            file_object.write(struct.pack('=IIII', seconds, int((timestamp - seconds) * 1e6), len(frame), len(frame)))
+            file_object.write(frame)
+
+
+def send(interface, frame_list, rate=0.0):
+    # Paced in 1 ms slots, as fast as the socket takes them when rate is 0; returns the frames sent
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    sock.bind((interface, 0))
+    sent = 0
+    start = time.perf_counter()
+    for frame in frame_list:
+        if rate > 0:
+            due = start + sent / rate
+            delay = due - time.perf_counter()
+            if delay > 0.001:
+                time.sleep(delay)
+        try:
+            sock.send(frame)
+            sent += 1
+        except BlockingIOError:
+            pass
+    sock.close()
+    return sent
+
+
+def main(argv):
+    count_neighbors = 100
+    lldp_share = 0.5
+    mix = 'full'
+    noise = 0
+    count = 10000
+    rate = 0.0
+    output = None
+    interface = None
+    try:
+        opts, args = getopt.getopt(argv, "c:hi:l:m:n:N:o:r:", ["count=", "iface=", "lldp=", "mix=", "neighbors=",
+                                                               "noise=", "output=", "rate="])
+    except getopt.GetoptError:
+        print(HELP)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(HELP)
+            sys.exit()
+        elif opt in ("-c", "--count"):
+            count = int(arg)
+        elif opt in ("-i", "--iface"):
+            interface = arg
+        elif opt in ("-l", "--lldp"):
+            lldp_share = float(arg)
+        elif opt in ("-m", "--mix"):
+            mix = arg
+        elif opt in ("-n", "--neighbors"):
+            count_neighbors = int(arg)
+        elif opt in ("-N", "--noise"):
+            noise = int(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-r", "--rate"):
+            rate = float(arg)
+    if mix not in MIXES or (output is None) == (interface is None):
+        print(HELP)
+        sys.exit(2)
+
+    frame_list = frames(neighbors(count_neighbors, lldp_share), count, mix, noise)
+    if output is not None:
+        write_pcap(output, frame_list, rate)
+        print('%d frames written to %s' % (len(frame_list), output))
+    else:
+        start = time.perf_counter()
+        sent = send(interface, frame_list, rate)
+        print('%d frames sent on %s in %.2f s' % (sent, interface, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,225 @@
+import ctypes
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import struct
+
+import decoder
+import logqueue
+from decoder import Neighbor
+
+ETH_P_ALL: int = 0x0003
+SOL_PACKET: int = 263
+SO_ATTACH_FILTER: int = 26
+PACKET_ADD_MEMBERSHIP: int = 1
+PACKET_MR_PROMISC: int = 1
+SNAPLEN: int = 0x40000
+
+# CDP_FILTER from mole.py compiled to classic BPF (tcpdump -dd), as (code, jt, jf, k):
+# (ether proto 0x88cc) or (ether host 01:00:0c:cc:cc:cc and ether[16:4] = 0x0300000C and ether[20:2] == 0x2000)
+CDP_FILTER_BPF = [
+    (0x28, 0, 0, 0x0000000c),   # (000) ldh [12]
+    (0x15, 12, 0, 0x000088cc),  # (001) jeq #0x88cc        jt 14  jf 2
+    (0x20, 0, 0, 0x00000002),   # (002) ld  [2]
+    (0x15, 0, 2, 0x0ccccccc),   # (003) jeq #0x0ccccccc    jt 4   jf 6
+    (0x28, 0, 0, 0x00000000),   # (004) ldh [0]
+    (0x15, 4, 0, 0x00000100),   # (005) jeq #0x100         jt 10  jf 6
+    (0x20, 0, 0, 0x00000008),   # (006) ld  [8]
+    (0x15, 0, 7, 0x0ccccccc),   # (007) jeq #0x0ccccccc    jt 8   jf 15
+    (0x28, 0, 0, 0x00000006),   # (008) ldh [6]
+    (0x15, 0, 5, 0x00000100),   # (009) jeq #0x100         jt 10  jf 15
+    (0x20, 0, 0, 0x00000010),   # (010) ld  [16]
+    (0x15, 0, 3, 0x0300000c),   # (011) jeq #0x300000c     jt 12  jf 15
+    (0x28, 0, 0, 0x00000014),   # (012) ldh [20]
+    (0x15, 0, 1, 0x00002000),   # (013) jeq #0x2000        jt 14  jf 15
+    (0x06, 0, 0, SNAPLEN),      # (014) ret #262144
+    (0x06, 0, 0, 0x00000000),   # (015) ret #0
+]
+
+
+class RawCapture(object):
+    def __init__(self, interface='eth0', program=None):
+        self.logger = logging.getLogger('mole')
+        self.interface = interface
+        if program is None:
+            program = CDP_FILTER_BPF
+        self.program = program
+        self.sock = None
+        self._filter = None
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        self.sock.bind((self.interface, ETH_P_ALL))
+        self.attach_filter(self.program)
+        # Frames queued between socket() and SO_ATTACH_FILTER did not go through the filter
+        self.drain()
+        ifindex = socket.if_nametoindex(self.interface)
+        mreq = struct.pack('IHH8s', ifindex, PACKET_MR_PROMISC, 0, b'')
+        self.sock.setsockopt(SOL_PACKET, PACKET_ADD_MEMBERSHIP, mreq)
+        self.logger.debug('Raw capture socket opened on ' + self.interface)
+
+    def attach_filter(self, program):
+        insns = b''.join(struct.pack('HBBI', code, jt, jf, k) for code, jt, jf, k in program)
+        # The kernel reads the instructions through the pointer, keep the buffer alive with the socket
+        self._filter = ctypes.create_string_buffer(insns)
+        fprog = struct.pack('HL', len(program), ctypes.addressof(self._filter))
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+    def drain(self):
+        self.sock.setblocking(False)
+        try:
+            while True:
+                self.sock.recv(SNAPLEN)
+        except BlockingIOError:
+            pass
+        self.sock.setblocking(True)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def setblocking(self, flag):
+        self.sock.setblocking(flag)
+
+    def recv(self):
+        return self.sock.recv(SNAPLEN)
+
+    def recv_batch(self, limit=64):
+        # Reads up to limit queued frames from a non-blocking socket
+        frames = []
+        try:
+            while len(frames) < limit:
+                frames.append(self.sock.recv(SNAPLEN))
+        except BlockingIOError:
+            pass
+        return frames
+
+    def __iter__(self):
+        while self.sock is not None:
+            yield self.recv()
+
+
+class CaptureProcess(object):
+    MAX_PENDING: int = 256
+
+    def __init__(self, interfaces=('eth0',), program=None):
+        self.logger = logging.getLogger('mole')
+        self.interfaces = list(interfaces)
+        self.program = program
+        self.process = None
+        self.reader = None
+        self.fd = -1
+        self._buffer = b''
+
+    def start(self):
+        # Spawned, not forked: the parent already runs threads, a fork would copy their locks and the log queue
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(target=CaptureProcess.run, name='mole-capture',
+                                       args=(self.interfaces, self.program, writer, self.logger.getEffectiveLevel()))
+        self.process.daemon = True
+        self.process.start()
+        writer.close()
+        self.reader = reader
+        self.fd = reader.fileno()
+        os.set_blocking(self.fd, False)
+        self.logger.debug('Capture process ' + str(self.process.pid) + ' started on ' + ', '.join(self.interfaces))
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(1)
+            self.process = None
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+            self.fd = -1
+
+    def fileno(self):
+        return self.fd
+
+    def read(self):
+        # Returns the neighbors the capture process published since the last call, None once it exited
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        if data == b'':
+            return None
+        data = self._buffer + data
+        neighbors = []
+        offset = 0
+        while True:
+            neighbor, offset = Neighbor.unpack(data, offset)
+            if neighbor is None:
+                break
+            neighbors.append(neighbor)
+        self._buffer = data[offset:]
+        return neighbors
+
+    @staticmethod
+    def run(interfaces, program, writer, level):
+        # Child side: the parent owns SIGINT, only keep a plain SIGTERM
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # Nothing of the parent's logging came along, the child writes to syslog itself
+        logger = logging.getLogger('mole')
+        logger.setLevel(level)
+        try:
+            handler = logging.handlers.SysLogHandler(address='/dev/log')
+        except OSError:
+            handler = logging.StreamHandler()
+        handler.formatter = logging.Formatter(logqueue.FORMAT)
+        logger.addHandler(handler)
+        write_fd = writer.fileno()
+        os.set_blocking(write_fd, False)
+        # One selector over the sockets of all interfaces, each registered with its RawCapture
+        selector = selectors.DefaultSelector()
+        for interface in interfaces:
+            capture = RawCapture(interface, program)
+            try:
+                capture.open()
+            except OSError as error:
+                logger.error('Capture process could not open ' + interface + ': ' + str(error))
+                return
+            capture.setblocking(False)
+            selector.register(capture.sock, selectors.EVENT_READ, capture)
+        # Latest record per neighbor that did not fit in the pipe yet, a slow display only ever sees the newest
+        pending = {}
+        waiting = False
+        while True:
+            for key, events in selector.select():
+                if key.data is not None:
+                    for frame in key.data.recv_batch():
+                        neighbor = decoder.decode(frame, key.data.interface)
+                        if neighbor is None:
+                            continue
+                        neighbor_key = (neighbor.interface, neighbor.protocol, neighbor.device_id, neighbor.port)
+                        pending.pop(neighbor_key, None)
+                        pending[neighbor_key] = neighbor.pack()
+                        if len(pending) > CaptureProcess.MAX_PENDING:
+                            del pending[next(iter(pending))]
+            # Records are below PIPE_BUF, so each write lands whole or not at all
+            while pending:
+                neighbor_key = next(iter(pending))
+                try:
+                    os.write(write_fd, pending[neighbor_key])
+                except BlockingIOError:
+                    break
+                except BrokenPipeError:
+                    return  # The display process is gone
+                del pending[neighbor_key]
+            if pending and not waiting:
+                selector.register(write_fd, selectors.EVENT_WRITE)
+                waiting = True
+            elif not pending and waiting:
+                selector.unregister(write_fd)
+                waiting = False
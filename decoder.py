@@ -0,0 +1,359 @@
+import struct
+
+CDP_DST: bytes = b'\x01\x00\x0c\xcc\xcc\xcc'
+LLDP_ETHERTYPE: int = 0x88cc
+
+# CDP TLV types
+CDP_DEVICE_ID: int = 0x0001
+CDP_ADDRESSES: int = 0x0002
+CDP_PORT_ID: int = 0x0003
+CDP_CAPABILITIES: int = 0x0004
+CDP_SOFTWARE_VERSION: int = 0x0005
+CDP_PLATFORM: int = 0x0006
+CDP_NATIVE_VLAN: int = 0x000a
+CDP_MANAGEMENT_ADDRESSES: int = 0x0016
+
+# LLDP TLV types
+LLDP_END: int = 0
+LLDP_CHASSIS_ID: int = 1
+LLDP_PORT_ID: int = 2
+LLDP_TTL: int = 3
+LLDP_SYSTEM_NAME: int = 5
+LLDP_SYSTEM_CAPABILITIES: int = 7
+LLDP_MANAGEMENT_ADDRESS: int = 8
+LLDP_ORGANIZATION: int = 127
+
+# LLDP-MED (TIA TR-41, OUI 00-12-BB) subtypes
+LLDP_MED_OUI: bytes = b'\x00\x12\xbb'
+LLDP_MED_NETWORK_POLICY: int = 2
+LLDP_MED_SERIAL_NUMBER: int = 8
+LLDP_MED_MODEL_NAME: int = 10
+
+CDP_DEFAULT_TTL: int = 180
+LLDP_DEFAULT_TTL: int = 120
+
+RECORD_HEADER = struct.Struct('!HIH')  # Record length, capabilities, TTL
+RECORD_STRINGS = ('protocol', 'device_id', 'port', 'vlan', 'platform', 'software', 'model', 'serial', 'ip',
+                  'interface')
+
+
+class Neighbor(object):
+    __slots__ = ('protocol', 'device_id', 'port', 'vlan', 'platform', 'software', 'model', 'serial', 'ip',
+                 'capabilities', 'ttl', 'interface')
+
+    def __init__(self, protocol: str, device_id: str = '', port: str = '', vlan: str = '', platform: str = '',
+                 software: str = '', model: str = '', serial: str = '', ip: str = '', capabilities: int = 0,
+                 ttl: int = 0, interface: str = ''):
+        self.protocol = protocol
+        self.device_id = device_id
+        self.port = port
+        self.vlan = vlan
+        self.platform = platform
+        self.software = software
+        self.model = model
+        self.serial = serial
+        self.ip = ip
+        self.capabilities = capabilities
+        self.ttl = ttl
+        self.interface = interface  # Capture interface the frame came in on
+
+    def capabilities_hex(self):
+        if self.protocol == 'CDP':
+            return '0x%08x' % self.capabilities
+        return '0x%04x' % self.capabilities
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in Neighbor.__slots__}
+
+    def __eq__(self, other):
+        # The TTL only drives ageing, a re-advertisement with a different one is the same neighbor
+        if not isinstance(other, Neighbor):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in Neighbor.__slots__ if name != 'ttl')
+
+    def pack(self):
+        # Length prefixed record, every string is cut to 255 bytes so a record always fits in PIPE_BUF
+        data = b''
+        for name in RECORD_STRINGS:
+            raw = getattr(self, name).encode('utf-8')[:255]
+            data += bytes([len(raw)]) + raw
+        return RECORD_HEADER.pack(RECORD_HEADER.size - 2 + len(data), self.capabilities, self.ttl) + data
+
+    @staticmethod
+    def unpack(data, offset=0):
+        # Returns (Neighbor, offset of the next record), or (None, offset) when the record is incomplete
+        if offset + RECORD_HEADER.size > len(data):
+            return None, offset
+        length, capabilities, ttl = RECORD_HEADER.unpack_from(data, offset)
+        end = offset + 2 + length
+        if end > len(data):
+            return None, offset
+        values = []
+        position = offset + RECORD_HEADER.size
+        for name in RECORD_STRINGS:
+            size = data[position]
+            values.append(bytes(data[position + 1:position + 1 + size]).decode('utf-8', 'replace'))
+            position += 1 + size
+        neighbor = Neighbor(capabilities=capabilities, ttl=ttl, **dict(zip(RECORD_STRINGS, values)))
+        return neighbor, end
+
+    def __repr__(self):
+        return 'Neighbor(' + ', '.join(name + '=' + repr(getattr(self, name)) for name in Neighbor.__slots__) + ')'
+
+
+def _text(value):
+    return bytes(value).decode('utf-8', 'replace').rstrip('\x00')
+
+
+def _ipv4(value):
+    return '.'.join(str(b) for b in value)
+
+
+def _mac(value):
+    return ':'.join('%02x' % b for b in value)
+
+
+def _cdp_addresses(value):
+    # Number of addresses, then (protocol type, protocol length, protocol, address length, address)
+    if len(value) < 4:
+        return ''
+    count = struct.unpack_from('!I', value)[0]
+    offset = 4
+    for i in range(count):
+        if offset + 2 > len(value):
+            break
+        proto_len = value[offset + 1]
+        proto = bytes(value[offset + 2:offset + 2 + proto_len])
+        offset += 2 + proto_len
+        if offset + 2 > len(value):
+            break
+        addr_len = struct.unpack_from('!H', value, offset)[0]
+        addr = value[offset + 2:offset + 2 + addr_len]
+        offset += 2 + addr_len
+        if proto == b'\xcc' and addr_len == 4:
+            return _ipv4(addr)
+    return ''
+
+
+def _cdp_device_id(neighbor, value):
+    neighbor.device_id = _text(value)
+
+
+def _cdp_address(neighbor, value):
+    if neighbor.ip == '':
+        neighbor.ip = _cdp_addresses(value)
+
+
+def _cdp_port_id(neighbor, value):
+    neighbor.port = _text(value)
+
+
+def _cdp_capabilities(neighbor, value):
+    if len(value) >= 4:
+        neighbor.capabilities = struct.unpack_from('!I', value)[0]
+
+
+def _cdp_software_version(neighbor, value):
+    neighbor.software = _text(value)
+
+
+def _cdp_platform(neighbor, value):
+    neighbor.platform = _text(value)
+
+
+def _cdp_native_vlan(neighbor, value):
+    if len(value) >= 2:
+        neighbor.vlan = str(struct.unpack_from('!H', value)[0])
+
+
+CDP_TLVS = {
+    CDP_DEVICE_ID: _cdp_device_id,
+    CDP_ADDRESSES: _cdp_address,
+    CDP_PORT_ID: _cdp_port_id,
+    CDP_CAPABILITIES: _cdp_capabilities,
+    CDP_SOFTWARE_VERSION: _cdp_software_version,
+    CDP_PLATFORM: _cdp_platform,
+    CDP_NATIVE_VLAN: _cdp_native_vlan,
+    CDP_MANAGEMENT_ADDRESSES: _cdp_address,
+}
+
+
+def _lldp_chassis_id(neighbor, value):
+    # Subtype 5: network address, IANA address family 1 is IPv4
+    if len(value) == 6 and value[0] == 5 and value[1] == 1:
+        neighbor.ip = _ipv4(value[2:6])
+    elif neighbor.device_id == '':
+        if len(value) == 7 and value[0] == 4:
+            neighbor.device_id = _mac(value[1:7])
+        else:
+            neighbor.device_id = _text(value[1:])
+
+
+def _lldp_port_id(neighbor, value):
+    if len(value) < 2:
+        return
+    if value[0] == 3 and len(value) == 7:
+        neighbor.port = _mac(value[1:7])
+    else:
+        neighbor.port = _text(value[1:])
+
+
+def _lldp_ttl(neighbor, value):
+    if len(value) >= 2:
+        neighbor.ttl = struct.unpack_from('!H', value)[0]
+
+
+def _lldp_system_name(neighbor, value):
+    neighbor.device_id = _text(value)
+
+
+def _lldp_system_capabilities(neighbor, value):
+    if len(value) >= 2:
+        neighbor.capabilities = struct.unpack_from('!H', value)[0]
+
+
+def _lldp_management_address(neighbor, value):
+    # Address string length (subtype + address), subtype, address
+    if len(value) >= 6 and value[0] == 5 and value[1] == 1 and neighbor.ip == '':
+        neighbor.ip = _ipv4(value[2:6])
+
+
+def _lldp_med_network_policy(neighbor, value):
+    # Application type, then U/T/X flags, 12 bit VLAN ID, L2 priority and DSCP packed in 3 bytes
+    if len(value) >= 4 and neighbor.vlan == '':
+        policy = (value[1] << 16) | (value[2] << 8) | value[3]
+        neighbor.vlan = str((policy >> 9) & 0x0fff)
+
+
+def _lldp_med_serial_number(neighbor, value):
+    neighbor.serial = _text(value)
+
+
+def _lldp_med_model_name(neighbor, value):
+    neighbor.model = _text(value)
+
+
+LLDP_MED_TLVS = {
+    LLDP_MED_NETWORK_POLICY: _lldp_med_network_policy,
+    LLDP_MED_SERIAL_NUMBER: _lldp_med_serial_number,
+    LLDP_MED_MODEL_NAME: _lldp_med_model_name,
+}
+
+
+def _lldp_organization(neighbor, value):
+    if len(value) >= 4 and bytes(value[0:3]) == LLDP_MED_OUI:
+        handler = LLDP_MED_TLVS.get(value[3])
+        if handler is not None:
+            handler(neighbor, value[4:])
+
+
+LLDP_TLVS = {
+    LLDP_CHASSIS_ID: _lldp_chassis_id,
+    LLDP_PORT_ID: _lldp_port_id,
+    LLDP_TTL: _lldp_ttl,
+    LLDP_SYSTEM_NAME: _lldp_system_name,
+    LLDP_SYSTEM_CAPABILITIES: _lldp_system_capabilities,
+    LLDP_MANAGEMENT_ADDRESS: _lldp_management_address,
+    LLDP_ORGANIZATION: _lldp_organization,
+}
+
+
+def decode_cdp(payload):
+    # Version, TTL, checksum, then (type, length, value) with the length covering the 4 byte header
+    if len(payload) < 4:
+        return None
+    neighbor = Neighbor('CDP', ttl=payload[1] or CDP_DEFAULT_TTL)
+    offset = 4
+    end = len(payload)
+    while offset + 4 <= end:
+        tlv_type, tlv_len = struct.unpack_from('!HH', payload, offset)
+        if tlv_len < 4 or offset + tlv_len > end:
+            break
+        handler = CDP_TLVS.get(tlv_type)
+        if handler is not None:
+            handler(neighbor, payload[offset + 4:offset + tlv_len])
+        offset += tlv_len
+    if neighbor.device_id == '':
+        return None
+    return neighbor
+
+
+def decode_lldp(payload):
+    # 7 bit type and 9 bit length per TLV, terminated by an End Of LLDPDU TLV
+    neighbor = Neighbor('LLDP', ttl=LLDP_DEFAULT_TTL)
+    offset = 0
+    end = len(payload)
+    while offset + 2 <= end:
+        header = struct.unpack_from('!H', payload, offset)[0]
+        tlv_type = header >> 9
+        tlv_len = header & 0x01ff
+        offset += 2
+        if tlv_type == LLDP_END or offset + tlv_len > end:
+            break
+        handler = LLDP_TLVS.get(tlv_type)
+        if handler is not None:
+            handler(neighbor, payload[offset:offset + tlv_len])
+        offset += tlv_len
+    if neighbor.device_id == '':
+        return None
+    return neighbor
+
+
+def decode(frame, interface=''):
+    # Returns a Neighbor for CDP (802.3 + LLC/SNAP) and LLDP (Ethernet II) frames, None for anything else
+    frame = memoryview(frame)
+    if len(frame) < 14:
+        return None
+    if struct.unpack_from('!H', frame, 12)[0] == LLDP_ETHERTYPE:
+        neighbor = decode_lldp(frame[14:])
+    elif bytes(frame[0:6]) == CDP_DST and len(frame) >= 22 and \
+            bytes(frame[14:22]) == b'\xaa\xaa\x03\x00\x00\x0c\x20\x00':
+        neighbor = decode_cdp(frame[22:])
+    else:
+        return None
+    if neighbor is not None:
+        neighbor.interface = interface
+    return neighbor
+
+
+def from_pyshark(packet):
+    # Maps the pyshark dissection of a frame to the same record the native decoder produces
+    if hasattr(packet, 'cdp'):
+        cdp = packet.cdp
+        neighbor = Neighbor('CDP', cdp.DeviceID, cdp.PortID, capabilities=int(cdp.Capabilities, base=16))
+        if hasattr(cdp, 'native_vlan'):
+            neighbor.vlan = cdp.native_vlan
+        if hasattr(cdp, 'platform'):
+            neighbor.platform = cdp.platform
+        if hasattr(cdp, 'software_version'):
+            neighbor.software = cdp.software_version
+        if hasattr(cdp, 'nrgyz_ip_address'):
+            neighbor.ip = cdp.nrgyz_ip_address
+        if hasattr(cdp, 'ttl'):
+            neighbor.ttl = int(cdp.ttl)
+        else:
+            neighbor.ttl = CDP_DEFAULT_TTL
+        return neighbor
+    if hasattr(packet, 'lldp'):
+        lldp = packet.lldp
+        neighbor = Neighbor('LLDP', lldp.tlv_system_name, capabilities=int(lldp.tlv_system_cap, base=16))
+        if hasattr(lldp, 'port_id'):
+            neighbor.port = lldp.port_id
+        else:
+            neighbor.port = lldp.port_id_mac
+        if hasattr(lldp, 'chassis_id_ip4'):
+            neighbor.ip = lldp.chassis_id_ip4
+        elif hasattr(lldp, 'mgn_addr_ip4'):
+            neighbor.ip = lldp.mgn_addr_ip4
+        if hasattr(lldp, 'media_vlan_id'):
+            neighbor.vlan = lldp.media_vlan_id
+        if hasattr(lldp, 'media_model'):
+            neighbor.model = lldp.media_model
+        if hasattr(lldp, 'media_sn'):
+            neighbor.serial = lldp.media_sn
+        if hasattr(lldp, 'time_to_live'):
+            neighbor.ttl = int(lldp.time_to_live)
+        else:
+            neighbor.ttl = LLDP_DEFAULT_TTL
+        return neighbor
+    return None
@@ -0,0 +1,67 @@
+import csv
+import json
+import time
+
+from neighbors import NeighborTable
+
+FIELDS = ('interface', 'protocol', 'device_id', 'port', 'vlan', 'platform', 'software', 'model', 'serial', 'ip',
+          'capabilities', 'first_seen', 'last_seen', 'frames')
+
+
+class Item(object):
+    __slots__ = ('neighbor', 'first_seen', 'last_seen', 'frames')
+
+    def __init__(self, neighbor, timestamp):
+        self.neighbor = neighbor
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.frames = 0
+
+
+def _time(timestamp):
+    if timestamp <= 0:
+        return ''
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(timestamp)) + 'Z'
+
+
+class Inventory(object):
+    # Deduplicated neighbors of offline captures, keyed like the live neighbor table
+    def __init__(self):
+        self._items = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, neighbor, timestamp=0.0):
+        key = NeighborTable.key(neighbor)
+        item = self._items.get(key)
+        if item is None:
+            item = Item(neighbor, timestamp)
+            self._items[key] = item
+        else:
+            # The latest advertisement wins, e.g. after a VLAN or IP change
+            if timestamp >= item.last_seen:
+                item.neighbor = neighbor
+                item.last_seen = timestamp
+            if 0 < timestamp < item.first_seen or item.first_seen <= 0:
+                item.first_seen = timestamp
+        item.frames += 1
+        return item
+
+    def rows(self):
+        for item in sorted(self._items.values(), key=lambda item: NeighborTable.key(item.neighbor)):
+            row = {name: getattr(item.neighbor, name) for name in FIELDS[:10]}
+            row['capabilities'] = item.neighbor.capabilities_hex()
+            row['first_seen'] = _time(item.first_seen)
+            row['last_seen'] = _time(item.last_seen)
+            row['frames'] = item.frames
+            yield row
+
+    def write_csv(self, file):
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(self.rows())
+
+    def write_json(self, file):
+        json.dump(list(self.rows()), file, indent=2)
+        file.write('\n')
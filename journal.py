@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+
+class Journal(object):
+    # JSON Lines discovery journal, one line per neighbor event, written in batches by a background thread
+    FLUSH_INTERVAL: float = 5.0
+    FLUSH_SIZE: int = 64
+    MAX_PENDING: int = 1024
+    MAX_SIZE: int = 1024 * 1024
+    BACKUPS: int = 3
+    SPILL_INTERVAL: float = 300.0
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE, max_size=MAX_SIZE,
+                 backups=BACKUPS, spill_dir=None, spill_interval=SPILL_INTERVAL):
+        self.logger = logging.getLogger('mole')
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        # The journal never takes more than max_size * (backups + 1) bytes
+        self.max_size = max_size
+        self.backups = backups
+        # With the journal on tmpfs, a copy is kept in spill_dir on persistent storage
+        self.spill_dir = spill_dir
+        self.spill_interval = spill_interval
+        self.pending = []
+        self.dropped = 0
+        self.written = 0
+        self.spilled = True  # Nothing written since the last spill
+        self.changed = threading.Condition()
+        self.running = False
+        self.thread = threading.Thread(target=self.run, args=(), name='journal')
+        self.thread.daemon = True
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        if self.spill_dir is not None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            if not os.path.exists(self.path):
+                # tmpfs was wiped by a reboot, carry on from the persistent copy
+                self.restore()
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        with self.changed:
+            self.running = False
+            self.changed.notify()
+        self.thread.join()
+
+    def record(self, event, neighbor):
+        # Only queues the event, formatting and writing happen on the journal thread
+        line = (time.time(), event, neighbor)
+        with self.changed:
+            if len(self.pending) >= self.MAX_PENDING:
+                # The writer is stuck, keep the newest events
+                del self.pending[0]
+                self.dropped += 1
+            self.pending.append(line)
+            if len(self.pending) >= self.flush_size:
+                self.changed.notify()
+
+    def run(self):
+        flush_at = time.monotonic() + self.flush_interval
+        spill_at = time.monotonic() + self.spill_interval
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: len(self.pending) >= self.flush_size or not self.running,
+                                      max(0.0, flush_at - time.monotonic()))
+                running = self.running
+                lines = self.pending
+                self.pending = []
+            now = time.monotonic()
+            flush_at = now + self.flush_interval
+            if lines:
+                self.write(lines)
+            if self.spill_dir is not None and not self.spilled and (now >= spill_at or not running):
+                self.spill()
+                spill_at = now + self.spill_interval
+            if not running:
+                break
+
+    @staticmethod
+    def format(line):
+        timestamp, event, neighbor = line
+        record = dict(time=time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(timestamp)), event=event)
+        record.update(neighbor.as_dict())
+        return json.dumps(record, separators=(',', ':')) + '\n'
+
+    def write(self, lines):
+        try:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            chunk = []
+            for line in lines:
+                data = Journal.format(line).encode('utf-8')
+                if size > 0 and size + len(data) > self.max_size:
+                    self.append(chunk)
+                    self.rotate()
+                    chunk = []
+                    size = 0
+                chunk.append(data)
+                size += len(data)
+            self.append(chunk)
+            self.written += len(lines)
+            self.spilled = False
+        except OSError as e:
+            self.logger.error('Journal write failed: ' + str(e))
+
+    def append(self, chunk):
+        if chunk:
+            with open(self.path, 'ab') as file_object:
+                file_object.write(b''.join(chunk))
+
+    def files(self):
+        # The journal and its backups, newest first
+        return [self.path] + [self.path + '.' + str(i) for i in range(1, self.backups + 1)]
+
+    def rotate(self):
+        files = self.files()
+        if os.path.exists(files[-1]):
+            os.remove(files[-1])
+        for i in range(len(files) - 1, 0, -1):
+            if os.path.exists(files[i - 1]):
+                os.replace(files[i - 1], files[i])
+
+    def spill(self):
+        # Copies the journal to persistent storage, each file replaced atomically
+        try:
+            for source in self.files():
+                target = os.path.join(self.spill_dir, os.path.basename(source))
+                if not os.path.exists(source):
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                shutil.copyfile(source, target + '.tmp')
+                os.replace(target + '.tmp', target)
+            self.spilled = True
+        except OSError as e:
+            self.logger.error('Journal spill failed: ' + str(e))
+
+    def restore(self):
+        for target in self.files():
+            source = os.path.join(self.spill_dir, os.path.basename(target))
+            if os.path.exists(source):
+                shutil.copyfile(source, target)
@@ -0,0 +1,80 @@
+import logging
+import logging.handlers
+import queue
+import time
+
+FORMAT: str = '%(filename)s[%(process)d]:  %(message)s'
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    # Hands records to a QueueListener without ever blocking the caller, records that do not fit are counted
+    QUEUE_SIZE: int = 1000
+
+    def __init__(self, size=QUEUE_SIZE):
+        super().__init__(queue.Queue(size))
+        self.dropped = 0
+        self._reported = 0
+
+    def prepare(self, record):
+        # Listener and callers share the process, so the message is formatted on the listener thread.
+        # Only tracebacks are rendered here, while the exception is still at hand.
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped != self._reported:
+                self.queue.put_nowait(logging.makeLogRecord(
+                    dict(name=record.name, levelno=logging.WARNING, levelname='WARNING',
+                         msg='%d log records dropped, the log queue was full', args=(self.dropped - self._reported,))))
+                self._reported = self.dropped
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    # Token bucket per logging call site: rate records per second, bursts up to burst records. Only records up to
+    # level are limited, one INFO call site logs every neighbor and each of those lines has to reach syslog.
+    RATE: float = 1.0
+    BURST: int = 10
+    LEVEL: int = logging.DEBUG
+
+    def __init__(self, rate=RATE, burst=BURST, level=LEVEL):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.level = level
+        self._buckets = {}  # (pathname, lineno) -> [tokens, last refill, suppressed]
+
+    def filter(self, record):
+        if self.rate <= 0 or record.levelno > self.level:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now, 0]
+        bucket[0] = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1.0
+        if bucket[2] > 0:
+            record.args = (record.getMessage(), bucket[2])
+            record.msg = '%s (%d similar messages suppressed)'
+            bucket[2] = 0
+        return True
+
+
+def start(logger, handlers, size=BoundedQueueHandler.QUEUE_SIZE, rate=RateLimitFilter.RATE,
+          burst=RateLimitFilter.BURST):
+    # Puts handlers behind a bounded queue drained by a listener thread, returns the listener to stop on exit
+    handler = BoundedQueueHandler(size)
+    handler.addFilter(RateLimitFilter(rate, burst))
+    listener = logging.handlers.QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    logger.addHandler(handler)
+    listener.start()
+    return listener
@@ -0,0 +1,179 @@
+import asyncio
+import bisect
+import logging
+import socket
+
+CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+SO_BINDTODEVICE: int = getattr(socket, 'SO_BINDTODEVICE', 25)
+
+
+class Counter(object):
+    # A plain integer, every counter has a single writer so no lock is needed
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Histogram(object):
+    # Counts per bucket, only made cumulative when scraped
+    __slots__ = ('buckets', 'counts', 'sum')
+    BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Family(object):
+    # One metric name, a child per combination of label values
+    def __init__(self, name, kind, text, labels=(), factory=Counter):
+        self.name = name
+        self.kind = kind
+        self.text = text
+        self.label_names = labels
+        self.factory = factory
+        self.children = {}
+        self.callback = None  # Returns {label values: value} at scrape time, instead of children
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.factory()
+        return child
+
+    def samples(self):
+        if self.callback is not None:
+            return self.callback().items()
+        return [(values, child.value) for values, child in list(self.children.items())]
+
+    def label_text(self, values, extra=''):
+        pairs = ['%s="%s"' % (name, _escape(str(value))) for name, value in zip(self.label_names, values)]
+        if extra != '':
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def expose(self, lines):
+        lines.append('# HELP ' + self.name + ' ' + self.text)
+        lines.append('# TYPE ' + self.name + ' ' + self.kind)
+        if self.kind != 'histogram':
+            for values, value in self.samples():
+                if value is not None:
+                    lines.append(self.name + self.label_text(values) + ' ' + _number(value))
+            return
+        for values, histogram in list(self.children.items()):
+            total = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), list(histogram.counts)):
+                total += count
+                lines.append(self.name + '_bucket' + self.label_text(values, 'le="' + _number(bound) + '"') + ' ' +
+                             str(total))
+            lines.append(self.name + '_sum' + self.label_text(values) + ' ' + _number(histogram.sum))
+            lines.append(self.name + '_count' + self.label_text(values) + ' ' + str(total))
+
+
+class Registry(object):
+    def __init__(self):
+        self.families = []
+
+    def _add(self, family):
+        self.families.append(family)
+        return family
+
+    def counter(self, name, text, labels=()):
+        return self._add(Family(name, 'counter', text, labels))
+
+    def histogram(self, name, text, labels=(), buckets=Histogram.BUCKETS):
+        return self._add(Family(name, 'histogram', text, labels, lambda: Histogram(buckets)))
+
+    def gauge(self, name, text, callback, labels=()):
+        # Read at scrape time: callback returns a value, or {label values: value} with labels
+        family = self._add(Family(name, 'gauge', text, labels))
+        family.callback = callback if labels else lambda: {(): callback()}
+        return family
+
+    def collected(self, name, text, callback, labels=()):
+        # A counter some other object keeps, read at scrape time like a gauge
+        family = self.gauge(name, text, callback, labels)
+        family.kind = 'counter'
+        return family
+
+    def expose(self):
+        lines = []
+        for family in self.families:
+            try:
+                family.expose(lines)
+            except Exception:
+                logging.getLogger('mole').exception('Metric ' + family.name + ' failed')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer(object):
+    # Prometheus text exposition on one interface, nothing but a listening socket until scraped
+    PORT: int = 9110
+    TIMEOUT: float = 5.0
+
+    def __init__(self, registry, interface='', port=PORT):
+        self.logger = logging.getLogger('mole')
+        self.registry = registry
+        self.interface = interface
+        self.port = port
+        self.server = None
+        self.scrapes = 0
+
+    async def start(self):
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        if self.interface != '':
+            # Bound to the device, not an address, so DHCP changes on the bridge need no rebind
+            sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, self.interface.encode())
+        sock.bind(('::', self.port))
+        sock.setblocking(False)
+        self.server = await asyncio.start_server(self.handle, sock=sock)
+        self.logger.info('Metrics on port ' + str(self.port) + (' of ' + self.interface if self.interface else ''))
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.TIMEOUT)
+            method, path = (request.split(b' ', 2) + [b'', b''])[:2]
+            if method != b'GET':
+                status, body = '405 Method Not Allowed', ''
+            elif path.split(b'?', 1)[0] not in (b'/metrics', b'/'):
+                status, body = '404 Not Found', ''
+            else:
+                self.scrapes += 1
+                status, body = '200 OK', self.registry.expose()
+            data = body.encode()
+            writer.write(('HTTP/1.0 ' + status + '\r\nContent-Type: ' + CONTENT_TYPE + '\r\nContent-Length: ' +
+                          str(len(data)) + '\r\nConnection: close\r\n\r\n').encode() + data)
+            await asyncio.wait_for(writer.drain(), self.TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(int(value))
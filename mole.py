@@ -1,34 +1,59 @@
 #!/usr/bin/python
 
+import asyncio
+import atexit
 import configparser
 import getopt
 import logging
 import logging.handlers
 import os
-import pprint
 import signal
 import sys
 import threading
 import time
-from inspect import getmembers
-
-import netifaces
-import pyshark
-
-from LCD1602 import LCD1602
-from PoEHAT import BUZZER
-from PoEHAT import FAN
-from PoEHAT import FANCONTROL
-from SSD1306 import SSD1306
-from pager import Pager
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import decoder
+import logqueue
+import metrics
+from capture import CaptureProcess, RawCapture
+from inventory import Inventory
+from journal import Journal
+from metrics import MetricsServer
+from neighbors import FrameCache, NeighborTable
+from netlink import AddressMonitor
+from pager import NeighborPages, Pager
+from pcapfile import PcapReader
+from sinks import DisplaySink, Frame
+from tshark import TsharkCapture
+
+if typing.TYPE_CHECKING:
+    # The display, fan and buzzer drivers need the Pi's GPIO and I2C modules, main() imports them when enabled
+    from LCD1602 import LCD1602
+    from PoEHAT import BUZZER
+    from PoEHAT import FAN
+    from PoEHAT import FANCONTROL
+    from SSD1306 import SSD1306
+
+try:
+    import pyshark
+except ImportError:
+    pyshark = None
 
 DIR_PATH: str = os.path.dirname(os.path.abspath(__file__))
-HELP: str = DIR_PATH + '/mole.py -h | -f <device_filter> -i <cap_interface>'
+HELP: str = DIR_PATH + '/mole.py -h | -f <device_filter> -i <cap_interface>[,<cap_interface>...] | ' \
+    '-f <device_filter> -r <pcap_file> [-r <pcap_file>...] [-o <output.csv|output.json>]'
 
 # Define CDP settings
 CDP_FILTER: str = \
     '(ether proto 0x88cc) or (ether host 01:00:0c:cc:cc:cc and ether[16:4] = 0x0300000C and ether[20:2] == 0x2000)'
 DEFAULT_FILTER: int = 0x00000008
+NEIGHBOR_LINES: int = 4
+BUS_WORKERS: int = 2
+LCD_BACKENDS = ('gpio', 'pcf8574')
+WORKER_RESTARTS: int = 3
+WORKER_RESTART_DELAY: float = 5.0
 # Capabilities: 0x00000???
 # .... .... ...1 = Router
 # .... .... ..1. = Transparent Bridge
@@ -43,36 +68,52 @@ DEFAULT_FILTER: int = 0x00000008
 # .1.. .... .... = Two Port Mac Relay
 
 capability: int = DEFAULT_FILTER
-cap_interface: str = 'eth0'
+cap_interfaces: list = ['eth0']
+capture_backend: str = 'native'
 config: configparser = configparser.ConfigParser()
 logger: logging = logging.getLogger('mole')
-log_file: str
+journal: Journal = None  # Discovery journal, None when disabled
 
 has_buzzer: bool
 has_fan: bool
 has_fan_control: bool
 has_oled: bool
 has_lcd: bool
-lcd: LCD1602
-oled: SSD1306
-buzzer: BUZZER
-fan: FAN
-fancontrol: FANCONTROL
+lcd: 'LCD1602'
+oled: 'SSD1306'
+buzzer: 'BUZZER'
+beep_filtered: bool = False
+fan: 'FAN'
+fancontrol: 'FANCONTROL'
 pager: Pager
-pager_running: bool = False
+neighbors: NeighborTable
+neighbor_pages: NeighborPages  # Pages of the neighbors after the status page, formatted when shown
+frame_cache: FrameCache = None  # Fingerprints of raw frames already handled, None when disabled
+page_interval: float = 3.0
 ip_interface: str = 'br0'
-ip: str = '0.0.0.0'
-
-
-def debug_dump(data):
-    global log_file
-    t = time.localtime()
-    current_time = time.strftime("%H:%M:%S", t)
-    with open(log_file, "a") as file_object:
-        file_object.write(current_time + ": \n")
-        file_object.write(data)
-        file_object.write("\n----------------------------------------------------------------------------\n")
-        file_object.close()
+ip: str = ''
+monitor: AddressMonitor
+captures: list = []  # RawCapture per interface
+capture_process: bool = False
+worker: CaptureProcess = None  # Capture and decode in a separate process
+worker_restarts: int = 0
+tshark: TsharkCapture = None  # tshark printing only the neighbor fields
+loop: asyncio.AbstractEventLoop
+bus: ThreadPoolExecutor  # Blocking SMBus and GPIO calls
+stopping: asyncio.Event
+sinks: list = []  # DisplaySink per display, every one draws on its own thread
+metrics_server: MetricsServer = None  # Prometheus endpoint, None when disabled
+thermal: str = '/sys/class/thermal/thermal_zone0/temp'
+marquee: bool = True  # Scroll lines too long for the OLED in hardware
+
+# Written on the hot paths, read only when scraped
+registry: metrics.Registry = metrics.Registry()
+frames_received = registry.counter('mole_frames_received_total', 'Frames read from the capture sockets', ('interface',))
+frames_accepted = registry.counter('mole_frames_accepted_total', 'Frames whose neighbor passes the capability mask',
+                                   ('interface',))
+decode_seconds = registry.histogram('mole_decode_seconds', 'Time to decode a frame into a neighbor')
+render_seconds = registry.histogram('mole_render_seconds', 'Time to draw a page on a display', ('display',),
+                                    (1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0))
 
 
 def short_ifname(line):
@@ -86,107 +127,474 @@ def short_ifname(line):
     return line
 
 
+def parse_interfaces(value):
+    return [interface.strip() for interface in value.split(',') if interface.strip() != '']
+
+
+def decode(frame, interface):
+    start = time.perf_counter()
+    neighbor = decoder.decode(frame, interface)
+    decode_seconds.labels().observe(time.perf_counter() - start)
+    return neighbor
+
+
+def print_frame_info(frame, interface):
+    global frame_cache
+    if frame_cache is None:
+        print_neighbor_info(decode(frame, interface))
+        return
+    # A periodic re-advertisement identical to the last one only pushes the neighbor's expiry out
+    key, fingerprint = frame_cache.lookup(frame, interface)
+    if key is not None:
+        # Only accepted neighbors are stored, so a hit is an accepted frame
+        frames_accepted.labels(interface).inc()
+        return
+    entry = print_neighbor_info(decode(frame, interface))
+    if entry is not None:
+        frame_cache.store(fingerprint, entry)
+
+
 def print_packet_info(packet):
-    global has_buzzer, has_fan, has_fan_control, has_oled, has_lcd, lcd, logger, log_file, oled, buzzer, capability, pager
-    logger.debug('Got NEW PACKET! :)')
+    global cap_interfaces
+    interface = getattr(packet.frame_info, 'interface_name', cap_interfaces[0])
+    frames_received.labels(interface).inc()
+    start = time.perf_counter()
+    neighbor = decoder.from_pyshark(packet)
+    decode_seconds.labels().observe(time.perf_counter() - start)
+    if neighbor is not None:
+        # tshark names the interface of every frame when it captures on several
+        neighbor.interface = interface
+    print_neighbor_info(neighbor)
+
+
+def describe(neighbor):
+    return neighbor.interface + ': ' + neighbor.protocol + ' ' + neighbor.device_id + " (" + neighbor.ip + "), " + \
+        neighbor.port + ", " + neighbor.capabilities_hex()
+
+
+def neighbor_lines(neighbor):
+    line = short_ifname(neighbor.port)
+    if neighbor.vlan != '':
+        line += ', V' + neighbor.vlan
+    if neighbor.protocol == 'CDP':
+        detail, extra = neighbor.platform, neighbor.software
+    else:
+        detail, extra = neighbor.model, neighbor.serial
+    if extra != '':
+        detail += " (" + extra + ")"
+    return [neighbor.device_id, line, detail, neighbor.ip]
+
+
+def expire_neighbors():
+    global logger, neighbors, journal, pager
+    expired = neighbors.expire()
+    for entry in expired:
+        logger.info('Neighbor expired: ' + describe(entry.neighbor))
+        if journal is not None:
+            journal.record('expired', entry.neighbor)
+    if expired:
+        pager.notify()
+
+
+def print_neighbor_info(neighbor):
+    global has_buzzer, has_fan, has_fan_control, has_oled, has_lcd, lcd, logger, oled, buzzer, capability, pager
+    global neighbors, neighbor_pages, beep_filtered, journal
+    entry = None
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug('Got NEW PACKET! :)')
+    # One beep per frame, two for a new neighbor, none for filtered frames when beep_filtered is set
+    beeps = 0 if beep_filtered else 1
+    if neighbor is not None and debug:
+        logger.debug('New packet is %s.', neighbor.protocol)
+    if neighbor is not None and neighbor.capabilities & capability == capability:
+        frames_accepted.labels(neighbor.interface).inc()
+        entry, new, changed = neighbors.update(neighbor)
+        beeps = 2 if new else 1
+        if changed:
+            logger.info('Just arrived: ' + describe(neighbor))
+            if journal is not None:
+                journal.record('new' if new else 'changed', neighbor)
+        elif debug:
+            logger.debug('Neighbor refreshed: %s', describe(neighbor))
+        if new:
+            pager.set_active_page(pager.pages + neighbor_pages.first_page(entry.key))
+        elif changed:
+            pager.notify()
+    if has_buzzer and beeps > 0:
+        buzzer.background_beep(0.1, beeps)
+    expire_neighbors()
+    return entry
+
+
+def address_changed(interface):
+    global logger, pager, ip, ip_interface
+    if interface.name != ip_interface:
+        return
+    if not interface.up:
+        ipb = 'Link down'
+    else:
+        ipb = interface.address()
+        if ipb == '':
+            ipb = 'No IP address'
+    if ipb != ip:
+        logger.info("IP address updated. New IP: " + ipb)
+        ip = ipb
+        pager.set_line(0, 1, ip)
+
+
+def draw_lcd(frame):
+    global logger, lcd
+    logger.debug("Printing page %d to LCD.", frame.page)
+    start = time.perf_counter()
+    lcd.print_buffer(frame.lines)
+    render_seconds.labels('lcd').observe(time.perf_counter() - start)
+
+
+def draw_oled(frame):
+    global logger, oled
+    logger.debug("Printing page %d to OLED.", frame.page)
+    start = time.perf_counter()
+    oled.print_buffer(frame.lines, frame.marquee)
+    render_seconds.labels('oled').observe(time.perf_counter() - start)
+
+
+def render(page, lines, version=0):
+    global pager, marquee, sinks
+    # The page is formatted once, every display draws it at its own pace and only ever the latest one
+    frame = Frame(page, lines, pager.get_marquee(page) if marquee else -1, version)
+    for sink in sinks:
+        sink.push(frame)
+
+
+async def pager_run():
+    global logger, pager, neighbors, page_interval
+    changed = asyncio.Event()
+    pager.listener = changed.set
+    drawn = None  # (page, page version) on the displays
+    rotate_at = time.monotonic() + page_interval
+    while True:
+        changed.clear()
+        now = time.monotonic()
+        if now >= rotate_at:
+            pager.next_page()
+            rotate_at = now + page_interval
+        expire_neighbors()
+        page, lines, page_version = pager.snapshot()
+        if drawn is None or drawn[0] != page:
+            # A page switch, either the rotation or a new neighbor, gets the full dwell time
+            rotate_at = time.monotonic() + page_interval
+        if (page, page_version) != drawn:
+            render(page, lines, page_version)
+            drawn = (page, page_version)
+        wake_at = rotate_at
+        expires = neighbors.next_expiry()
+        if expires is not None and expires < wake_at:
+            wake_at = expires
+        try:
+            await asyncio.wait_for(changed.wait(), max(0.0, wake_at - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def fan_run():
+    global fancontrol, loop, bus
+    while True:
+        await loop.run_in_executor(bus, fancontrol.step)
+        await asyncio.sleep(fancontrol.interval)
+
+
+async def buzzer_run():
+    global buzzer, loop, bus
+    requested = asyncio.Event()
+    buzzer.listener = requested.set
+    while True:
+        await requested.wait()
+        # Let the requests of a burst pile up into the pending pattern
+        await asyncio.sleep(buzzer.window)
+        requested.clear()
+        duration, count = buzzer.take()
+        for i in range(count):
+            if i > 0:
+                await asyncio.sleep(buzzer.GAP)
+            await loop.run_in_executor(bus, buzzer.on)
+            await asyncio.sleep(duration)
+            await loop.run_in_executor(bus, buzzer.off)
+
+
+def capture_ready(capture):
+    frames = capture.recv_batch()
+    frames_received.labels(capture.interface).inc(len(frames))
+    for frame in frames:
+        print_frame_info(frame, capture.interface)
+
+
+def worker_ready():
+    global worker, worker_restarts, loop, logger
+    found = worker.read()
+    if found is None:
+        # The pipe stays readable at end of file, it has to leave the loop or it spins
+        loop.remove_reader(worker.fileno())
+        worker.stop()
+        worker = None
+        if worker_restarts < WORKER_RESTARTS:
+            worker_restarts += 1
+            logger.error('Capture process exited, restarting it in %g s.', WORKER_RESTART_DELAY)
+            loop.call_later(WORKER_RESTART_DELAY, start_worker)
+        else:
+            logger.error('Capture process exited, no more neighbors will be captured.')
+        return
+    for neighbor in found:
+        # The capture process only publishes decoded neighbors, frames of anything else are not counted
+        frames_received.labels(neighbor.interface).inc()
+        print_neighbor_info(neighbor)
+
+
+def start_worker():
+    global cap_interfaces, worker, loop, stopping
+    if stopping.is_set():
+        return
+    worker = CaptureProcess(cap_interfaces)
+    worker.start()
+    loop.add_reader(worker.fileno(), worker_ready)
+
+
+def tshark_ready():
+    global tshark, loop, logger
+    start = time.perf_counter()
+    found = tshark.read()
+    if found is None:
+        logger.error('tshark stopped, no more neighbors will be captured.')
+        for message in tshark.messages():
+            logger.error(message)
+        loop.remove_reader(tshark.fileno())
+        return
+    if found:
+        # One stream read parses every line in it, the time is spread over them
+        seconds = (time.perf_counter() - start) / len(found)
+        for neighbor in found:
+            decode_seconds.labels().observe(seconds)
+            frames_received.labels(neighbor.interface).inc()
+    for neighbor in found:
+        print_neighbor_info(neighbor)
+
+
+def pyshark_run():
+    global cap_interfaces, loop
+    # pyshark runs its own event loop around tshark, hand every packet over to ours
+    live = pyshark.LiveCapture(cap_interfaces, bpf_filter=CDP_FILTER)
+    live.apply_on_packets(lambda packet: loop.call_soon_threadsafe(print_packet_info, packet))
+
+
+def start_capture():
+    global logger, cap_interfaces, capture_backend, captures, capture_process, tshark, loop
+    logger.info('Starting capture on interface ' + ', '.join(cap_interfaces))
+    if capture_backend == 'tshark':
+        if TsharkCapture.available():
+            tshark = TsharkCapture(cap_interfaces, CDP_FILTER)
+            tshark.start()
+            loop.add_reader(tshark.fileno(), tshark_ready)
+            return
+        logger.warning('tshark is not installed, using the native capture backend.')
+    if capture_backend == 'pyshark':
+        if pyshark is not None:
+            thread = threading.Thread(target=pyshark_run, args=())
+            thread.daemon = True
+            thread.start()
+            return
+        logger.warning('pyshark is not installed, using the native capture backend.')
+    if capture_process:
+        # Slow display I/O in this process can then never hold up reading the socket
+        start_worker()
+        return
+    # One socket per interface, all on the one event loop
+    for interface in cap_interfaces:
+        capture = RawCapture(interface)
+        capture.open()
+        capture.setblocking(False)
+        loop.add_reader(capture.fileno(), capture_ready, capture)
+        captures.append(capture)
+
+
+async def run():
+    global has_buzzer, has_fan, has_fan_control, buzzer, pager, cap_interfaces, monitor, journal, loop, bus, stopping
+    loop = asyncio.get_running_loop()
+    bus = ThreadPoolExecutor(max_workers=BUS_WORKERS, thread_name_prefix='bus')
+    stopping = asyncio.Event()
+    for signo in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signo, stopping.set)
+
+    # The pager task draws every change of the active page as soon as it happens
+    tasks = [loop.create_task(pager_run())]
+    if has_fan and has_fan_control:
+        tasks.append(loop.create_task(fan_run()))
+    if has_buzzer:
+        tasks.append(loop.create_task(buzzer_run()))
+
+    pager.set_line(0, 0, 'CDP Tester')
+    pager.set_line(0, 1, 'Source: ' + ','.join(cap_interfaces))
+    await asyncio.sleep(1)
+    pager.set_line(0, 0, pager.get_line(0, 1))
+    pager.set_line(0, 1, 'No IP address')
+    # Address and link changes of ip_interface are pushed by the kernel, the initial dump fills the page
+    monitor = AddressMonitor(address_changed)
+    monitor.open()
+    monitor.setblocking(False)
+    loop.add_reader(monitor.fileno(), monitor.read)
     if has_buzzer:
         buzzer.background_beep(0.1)
 
-    if hasattr(packet, 'cdp'):
-        logger.debug('New packet is CDP.')
-        capabilities = int(packet.cdp.Capabilities, base=16)
-        if capabilities & capability == capability:
-            ip = ''
-            if hasattr(packet.cdp, 'nrgyz_ip_address'):
-                ip = packet.cdp.nrgyz_ip_address
-            logger.info(
-                'Just arrived: CDP ' + packet.cdp.DeviceID + " (" + ip + "), " + packet.cdp.PortID + ", " + packet.cdp.Capabilities)
-            if logger.getEffectiveLevel() == logging.DEBUG:
-                debug_dump(pprint.pformat(getmembers(packet.cdp)))
-            pager.set_line(1, 0, packet.cdp.deviceID)
-            line = short_ifname(packet.cdp.PortID)
-            if hasattr(packet.cdp, 'native_vlan'):
-                line += ', V' + packet.cdp.native_vlan
-            pager.set_line(1, 1, line)
-            line = ''
-            if hasattr(packet.cdp, 'platform'):
-                line += packet.cdp.platform
-            if hasattr(packet.cdp, 'software_version'):
-                line += " (" + packet.cdp.software_version + ")"
-                pager.set_line(2, 0, line)
-            if ip != '':
-                pager.set_line(2, 1, ip)
-
-    if hasattr(packet, 'lldp'):
-        logger.debug('New packet is LLDP.')
-        capabilities = int(packet.lldp.tlv_system_cap, base=16)
-        if capabilities & capability == capability:
-            port = ''
-            if hasattr(packet.lldp, 'port_id'):
-                port = packet.lldp.port_id
-            else:
-                port = packet.lldp.port_id_mac
-            ip = ''
-            if hasattr(packet.lldp, 'chassis_id_ip4'):
-                ip = packet.lldp.chassis_id_ip4
-            elif hasattr(packet.lldp, 'mgn_addr_ip4'):
-                ip = packet.lldp.mgn_addr_ip4
-            logger.info(
-                'Just arrived: LLDP ' + packet.lldp.tlv_system_name + " (" + ip + "), " + port + ", " + packet.lldp.tlv_system_cap)
-            if logger.getEffectiveLevel() == logging.DEBUG:
-                debug_dump(pprint.pformat(getmembers(packet.lldp)))
-            pager.set_line(1, 0, packet.lldp.tlv_system_name)
-            line = short_ifname(port)
-            if hasattr(packet.lldp, 'media_vlan_id'):
-                line += ', V' + packet.lldp.media_vlan_id
-            pager.set_line(1, 1, line)
-            line = ''
-            if hasattr(packet.lldp, 'media_model'):
-                line += packet.lldp.media_model
-            if hasattr(packet.lldp, 'media_sn'):
-                line += " (" + packet.lldp.media_sn + ")"
-                pager.set_line(2, 0, line)
-            if ip != '':
-                pager.set_line(2, 1, ip)
-
-
-def pager_run():
-    global logger, pager, pager_running, has_lcd, has_oled, ip, ip_interface
-    ipb = ip
-    while pager_running:
-        ip_addr = netifaces.ifaddresses(ip_interface)[netifaces.AF_INET][0]
-        if 'addr' in ip_addr:
-            ipb = ip_addr['addr']
-        if ipb != ip:
-            logger.info("IP address updated. New IP: " + ipb)
-            ip = ipb
-            pager.set_line(0, 1, ip)
-        page = pager._active_page
-        if has_lcd:
-            logger.debug("Printing page " + str(page) + " to LCD.")
-            lcd.print_buffer(pager.get_active_page())
-        if has_oled:
-            logger.debug("Printing page " + str(page) + " to OLED.")
-            oled.print_buffer(pager.get_active_page())
-        pager.next_page()
-        time.sleep(3)
+    if journal is not None:
+        journal.start()
+    for sink in sinks:
+        sink.start()
+    if metrics_server is not None:
+        register_metrics()
+        try:
+            await metrics_server.start()
+        except OSError as error:
+            logger.error('Metrics endpoint not available: ' + str(error))
+    start_capture()
+    await stopping.wait()
+    await shutdown(tasks)
+    bus.shutdown()
+
+
+def cpu_temperature():
+    global thermal
+    try:
+        with open(thermal, 'rt') as f:
+            return int(f.read()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+def register_metrics():
+    global has_fan, has_oled, has_lcd, fan, oled, lcd, neighbors, frame_cache, journal, logger, sinks
+    # Everything kept elsewhere is read when scraped
+    registry.gauge('mole_neighbors', 'Neighbors in the table', lambda: len(neighbors))
+    registry.gauge('mole_cpu_temperature_celsius', 'CPU temperature', cpu_temperature)
+    devices = []
+    if has_oled:
+        devices.append(('oled', oled))
+    if has_lcd:
+        devices.append(('lcd', lcd))
+    if has_fan:
+        devices.append(('fan', fan))
+        registry.gauge('mole_fan_running', 'Whether the fan is on', lambda: fan.running)
+        registry.collected('mole_fan_on_seconds_total', 'Seconds the fan has run, its rate is the duty cycle',
+                           fan.on_time)
+    registry.collected('mole_frames_drawn_total', 'Pages drawn per display',
+                       lambda: {(sink.name, ): sink.drawn for sink in sinks}, ('display',))
+    registry.collected('mole_frames_dropped_total', 'Pages replaced by a newer one before a display drew them',
+                       lambda: {(sink.name, ): sink.dropped for sink in sinks}, ('display',))
+    registry.collected('mole_bus_transactions_total', 'I2C and GPIO transactions per device',
+                       lambda: {(name, ): device.transactions for name, device in devices}, ('device',))
+    if frame_cache is not None:
+        registry.collected('mole_frame_cache_hits_total', 'Frames that only refreshed a known neighbor',
+                           lambda: frame_cache.hits)
+        registry.collected('mole_frame_cache_misses_total', 'Frames that were decoded', lambda: frame_cache.misses)
+    if journal is not None:
+        registry.collected('mole_journal_written_total', 'Journal lines written', lambda: journal.written)
+        registry.collected('mole_journal_dropped_total', 'Journal lines dropped', lambda: journal.dropped)
+    queues = [handler for handler in logger.handlers if isinstance(handler, logqueue.BoundedQueueHandler)]
+    registry.collected('mole_log_dropped_total', 'Log records dropped on a full log queue',
+                       lambda: sum(handler.dropped for handler in queues))
+    registry.collected('mole_metrics_scrapes_total', 'Scrapes of this endpoint', lambda: metrics_server.scrapes)
+
+
+def read_files(files, output):
+    global logger, capability
+    # Offline mode: the neighbor inventory of capture files, no displays involved
+    inventory = Inventory()
+    for path in files:
+        started = time.monotonic()
+        reader = PcapReader(path)
+        reader.open()
+        try:
+            for interface, timestamp, frame in reader.frames():
+                neighbor = decoder.decode(frame, interface)
+                if neighbor is not None and neighbor.capabilities & capability == capability:
+                    inventory.add(neighbor, timestamp)
+        finally:
+            reader.close()
+        logger.info(path + ': ' + str(reader.frames_read) + ' frames, ' + str(reader.frames_matched) +
+                    ' CDP/LLDP in ' + '%.2f' % (time.monotonic() - started) + ' s')
+    if output == '-':
+        inventory.write_csv(sys.stdout)
+        return
+    with open(output, 'w', newline='') as file_object:
+        if output.endswith('.json'):
+            inventory.write_json(file_object)
+        else:
+            inventory.write_csv(file_object)
+    logger.info(str(len(inventory)) + ' neighbors written to ' + output)
+
+
+def finish():
+    global has_buzzer, has_fan, has_oled, has_lcd, lcd, fan, buzzer, oled
+    if has_lcd:
+        lcd.finish()
+    if has_oled:
+        oled.clear()
+    if has_fan:
+        fan.off()
+    if has_buzzer:
+        buzzer.off()
+
+
+async def shutdown(tasks):
+    global logger, pager, captures, worker, tshark, monitor, journal, loop, bus, sinks, frame_cache, metrics_server
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for capture in captures:
+        loop.remove_reader(capture.fileno())
+        capture.close()
+    if worker is not None:
+        loop.remove_reader(worker.fileno())
+        worker.stop()
+    if tshark is not None:
+        loop.remove_reader(tshark.fileno())
+        tshark.stop()
+    loop.remove_reader(monitor.fileno())
+    monitor.close()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    if frame_cache is not None:
+        logger.info('Frame cache: ' + str(frame_cache.hits) + ' hits, ' + str(frame_cache.misses) + ' misses')
+    if journal is not None:
+        # Writes what is still queued and spills it to persistent storage
+        await loop.run_in_executor(bus, journal.stop)
+
+    pager.set_page(0, ["Goodbye!".center(pager.width), " ".ljust(pager.width)])
+    render(0, pager.get_page(0))
+    for sink in sinks:
+        # Draws the goodbye page, then the displays belong to finish
+        await loop.run_in_executor(bus, sink.stop)
+    await asyncio.sleep(1)
+    await loop.run_in_executor(bus, finish)
+    logger.info('Mole app ended.')
 
 
 def main(argv):
     global has_buzzer, has_fan, has_fan_control, has_oled, has_lcd, lcd, oled, buzzer, fan, fancontrol, pager
-    global logger, log_file, cap_interface, capability, config, DIR_PATH, pager_running, ip, ip_interface
+    global logger, journal, cap_interfaces, capture_backend, capability, config, DIR_PATH, ip
+    global ip_interface, neighbors, page_interval, beep_filtered, capture_process, frame_cache, metrics_server, thermal
+    global marquee, neighbor_pages
 
     handler = logging.handlers.SysLogHandler(address='/dev/log')
-    formatter = logging.Formatter('%(filename)s[%(process)d]:  %(message)s')
+    formatter = logging.Formatter(logqueue.FORMAT)
     handler.formatter = formatter
-    logger.addHandler(handler)
     logger.setLevel(logging.DEBUG)
-    logger.info('Starting mole app')
 
     config.read(DIR_PATH + '/mole.ini')
-    cap_interface = config.get('GLOBAL', 'cap_interface', fallback='eth0')
+    cap_interfaces = parse_interfaces(config.get('GLOBAL', 'cap_interface', fallback='eth0'))
     ip_interface = config.get('GLOBAL', 'ip_interface', fallback='br0')
-    capability = int(config.get('GLOBAL', 'device_filter', fallback=DEFAULT_FILTER), base=16)
+    capture_backend = config.get('GLOBAL', 'capture_backend', fallback='native')
+    capture_process = config.getboolean('GLOBAL', 'capture_process', fallback=False)
+    page_interval = config.getfloat('GLOBAL', 'page_interval', fallback=3.0)
+    capability = int(config.get('GLOBAL', 'device_filter', fallback='%08x' % DEFAULT_FILTER), base=16)
     log_level = config.get('GLOBAL', 'log_level', fallback='INFO')
     if log_level == 'DEBUG':
         logger.setLevel(logging.DEBUG)
@@ -198,7 +606,17 @@ def main(argv):
         logger.setLevel(logging.ERROR)
     elif log_level == 'CRITICAL':
         logger.setLevel(logging.CRITICAL)
-    log_file = config.get('GLOBAL', 'log_file', fallback='debug.log')
+    if config.getboolean('JOURNAL', 'enabled', fallback=False):
+        journal = Journal(config.get('JOURNAL', 'file', fallback='discovery.jsonl'),
+                          config.getfloat('JOURNAL', 'flush_interval', fallback=Journal.FLUSH_INTERVAL),
+                          config.getint('JOURNAL', 'flush_size', fallback=Journal.FLUSH_SIZE),
+                          config.getint('JOURNAL', 'max_size', fallback=Journal.MAX_SIZE),
+                          config.getint('JOURNAL', 'backups', fallback=Journal.BACKUPS),
+                          config.get('JOURNAL', 'spill_dir', fallback=None),
+                          config.getfloat('JOURNAL', 'spill_interval', fallback=Journal.SPILL_INTERVAL))
+    if config.getboolean('METRICS', 'enabled', fallback=False):
+        metrics_server = MetricsServer(registry, config.get('METRICS', 'interface', fallback=ip_interface),
+                                       config.getint('METRICS', 'port', fallback=MetricsServer.PORT))
 
     has_buzzer = config.getboolean('BUZZER', 'enabled', fallback=False)
     has_fan = config.getboolean('FAN', 'enabled', fallback=False)
@@ -207,9 +625,11 @@ def main(argv):
     has_lcd = config.getboolean('LCD', 'enabled', fallback=False)
     text_width = 0
     text_height = 0
+    files = []
+    output = '-'
 
     try:
-        opts, args = getopt.getopt(argv, "df:hi:", ["filter=", "iface="])
+        opts, args = getopt.getopt(argv, "df:hi:o:r:", ["filter=", "iface=", "output=", "read="])
     except getopt.GetoptError:
         print(HELP)
         sys.exit(2)
@@ -222,28 +642,52 @@ def main(argv):
         elif opt in ("-f", "--filter"):
             capability = int(arg, base=16)
         elif opt in ("-i", "--iface"):
-            cap_interface = arg
+            cap_interfaces = parse_interfaces(arg)
+        elif opt in ("-r", "--read"):
+            files.append(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+
+    # Records go through a bounded queue, the syslog socket is written from the listener thread
+    handlers = [handler]
+    if files:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    listener = logqueue.start(logger, handlers,
+                              config.getint('GLOBAL', 'log_queue', fallback=logqueue.BoundedQueueHandler.QUEUE_SIZE),
+                              config.getfloat('GLOBAL', 'log_rate', fallback=logqueue.RateLimitFilter.RATE),
+                              config.getint('GLOBAL', 'log_burst', fallback=logqueue.RateLimitFilter.BURST))
+    atexit.register(listener.stop)
+    logger.info('Starting mole app')
+
+    if files:
+        read_files(files, output)
+        return
 
     if has_buzzer:
-        buzzer_gpio = config.get('BUZZER', 'BUZZER', fallback=BUZZER.BUZZER.B)
-        buzzer = BUZZER.BUZZER(buzzer_gpio)
+        from PoEHAT import BUZZER
+        buzzer_gpio = config.getint('BUZZER', 'BUZZER', fallback=BUZZER.BUZZER.B)
+        window = config.getfloat('BUZZER', 'window', fallback=BUZZER.BUZZER.WINDOW)
+        beep_filtered = config.getboolean('BUZZER', 'filtered', fallback=False)
+        buzzer = BUZZER.BUZZER(buzzer_gpio, window)
         buzzer.init()
     if has_fan:
+        from PoEHAT import FAN
         smbus_addr = config.getint('FAN', 'smbus_addr', fallback=FAN.FAN.SMBUS)
         fan_addr = int(config.get('FAN', 'fan_addr', fallback='0'), base=16)
         if fan_addr == 0:
             fan_addr = FAN.FAN.ADDRESS
         fan = FAN.FAN(smbus_addr, fan_addr)
         if has_fan_control:
+            from PoEHAT import FANCONTROL
             interval = config.getint('FAN', 'interval', fallback=5)
             temp_min = config.getint('FAN', 'temp_min', fallback=FANCONTROL.FANCONTROL.TEMP_MIN)
             temp_max = config.getint('FAN', 'temp_max', fallback=FANCONTROL.FANCONTROL.TEMP_MAX)
             thermal = config.get('FAN', 'thermal', fallback=FANCONTROL.FANCONTROL.THERMAL)
             fancontrol = FANCONTROL.FANCONTROL(fan, interval, temp_min, temp_max, thermal)
-            fancontrol.start()
         else:
             fan.on()
     if has_oled:
+        from SSD1306 import SSD1306
         width = config.getint('OLED', 'width', fallback=SSD1306.SSD1306.WIDTH)
         height = config.getint('OLED', 'height', fallback=SSD1306.SSD1306.HEIGHT)
         text_width = config.getint('OLED', 'text_width', fallback=SSD1306.SSD1306.TEXT_WIDTH)
@@ -252,90 +696,65 @@ def main(argv):
         oled_addr = int(config.get('OLED', 'oled_addr', fallback='0'), base=16)
         if oled_addr == 0:
             oled_addr = SSD1306.SSD1306.ADDRESS
+        font = config.get('OLED', 'font', fallback='Courier_New.ttf')
+        font_size = config.getint('OLED', 'font_size', fallback=SSD1306.SSD1306.FONT_SIZE)
+        marquee = config.getboolean('OLED', 'marquee', fallback=True)
         oled = SSD1306.SSD1306(width, height, smbus_addr, oled_addr, text_width, text_height,
-                               DIR_PATH + '/fonts/Courier_New.ttf', 15)
+                               DIR_PATH + '/fonts/' + font, font_size)
         oled.init()
         oled.clear()
+        sinks.append(DisplaySink('oled', draw_oled))
     if has_lcd:
+        from LCD1602 import LCD1602
         width = config.getint('LCD', 'width', fallback=LCD1602.LCD1602.WIDTH)
         if text_width < width:
             text_width = width
         height = config.getint('LCD', 'height', fallback=LCD1602.LCD1602.HEIGHT)
         if text_height < height:
             text_height = height
-        rs = config.getint('LCD', 'LCD_RS', fallback=LCD1602.LCD1602.RS)
-        e = config.getint('LCD', 'LCD_E', fallback=LCD1602.LCD1602.E)
-        d4 = config.getint('LCD', 'LCD_D4', fallback=LCD1602.LCD1602.D4)
-        d5 = config.getint('LCD', 'LCD_D5', fallback=LCD1602.LCD1602.D5)
-        d6 = config.getint('LCD', 'LCD_D6', fallback=LCD1602.LCD1602.D6)
-        d7 = config.getint('LCD', 'LCD_D7', fallback=LCD1602.LCD1602.D7)
         addrs = []
         for i in range(height):
             addr = int(config.get('LCD', 'line_' + str(i) + '_addr', fallback='0'), base=16)
             if addr == 0:
                 addr = LCD1602.LCD1602.ADDRS[i]
             addrs.insert(i, addr)
-        lcd = LCD1602.LCD1602(width, height, rs, e, d4, d5, d6, d7, addrs)
+        backend = config.get('LCD', 'backend', fallback='gpio').strip()
+        if backend not in LCD_BACKENDS:
+            # Falling back to GPIO would drive pins that may not be wired to the display at all
+            logger.error('Unknown LCD backend "' + backend + '", use one of ' + ', '.join(LCD_BACKENDS) + '.')
+            sys.exit(1)
+        if backend == 'pcf8574':
+            from LCD1602 import PCF8574
+            smbus_addr = config.getint('LCD', 'smbus_addr', fallback=PCF8574.PCF8574.SMBUS)
+            lcd_addr = int(config.get('LCD', 'lcd_addr', fallback='0'), base=16)
+            if lcd_addr == 0:
+                lcd_addr = PCF8574.PCF8574.ADDRESS
+            lcd = PCF8574.PCF8574(width, height, smbus_addr, lcd_addr, addrs,
+                                  config.getboolean('LCD', 'backlight', fallback=True))
+        else:
+            rs = config.getint('LCD', 'LCD_RS', fallback=LCD1602.LCD1602.RS)
+            e = config.getint('LCD', 'LCD_E', fallback=LCD1602.LCD1602.E)
+            d4 = config.getint('LCD', 'LCD_D4', fallback=LCD1602.LCD1602.D4)
+            d5 = config.getint('LCD', 'LCD_D5', fallback=LCD1602.LCD1602.D5)
+            d6 = config.getint('LCD', 'LCD_D6', fallback=LCD1602.LCD1602.D6)
+            d7 = config.getint('LCD', 'LCD_D7', fallback=LCD1602.LCD1602.D7)
+            d0 = config.getint('LCD', 'LCD_D0', fallback=None)
+            d1 = config.getint('LCD', 'LCD_D1', fallback=None)
+            d2 = config.getint('LCD', 'LCD_D2', fallback=None)
+            d3 = config.getint('LCD', 'LCD_D3', fallback=None)
+            lcd = LCD1602.LCD1602(width, height, rs, e, d4, d5, d6, d7, addrs, d0, d1, d2, d3)
         lcd.init()
+        sinks.append(DisplaySink('lcd', draw_lcd))
 
-    pager = Pager(text_width, text_height, 3)
-    pager_running = True
-    pager_thread = threading.Thread(target=pager_run, args=())
-    pager_thread.daemon = True
-    pager_thread.start()
-
-    ip_addr = netifaces.ifaddresses(ip_interface)[netifaces.AF_INET][0]
-    if 'addr' in ip_addr:
-        ip = ip_addr['addr']
-
-    pager.set_line(0, 0, 'CDP Tester')
-    pager.set_line(0, 1, 'Source: ' + cap_interface)
-
-    if has_lcd:
-        lcd.print_buffer(pager.get_page(0))
-    if has_oled:
-        oled.print_buffer(pager.get_page(0))
-    time.sleep(1)
-    pager.set_line(0, 0, pager.get_line(0, 1))
-    pager.set_line(0, 1, ip)
-    if has_lcd:
-        lcd.print_buffer(pager.get_page(0))
-    if has_oled:
-        oled.print_buffer(pager.get_page(0))
-    if has_buzzer:
-        buzzer.background_beep(0.1)
-
-    logger.info('Starting capture on interface ' + cap_interface)
-    capture = pyshark.LiveCapture(cap_interface, bpf_filter=CDP_FILTER)
-    capture.apply_on_packets(print_packet_info)
-    while True:
-        capture.sniff_continuously()
-
-
-def sigterm_handler(_signo, _stack_frame):
-    global has_buzzer, has_fan, has_fan_control, has_oled, has_lcd, lcd, fan, buzzer, oled, logger, DIR_PATH
-    global pager, pager_running
-
-    pager_running = False
-    pager.set_page(0, ["Goodbye!".center(pager.width), " ".ljust(pager.width)])
-    if has_lcd:
-        lcd.print_buffer(pager.get_page(0))
-    if has_oled:
-        oled.print_buffer(pager.get_page(0))
-    time.sleep(1)
-    if has_lcd:
-        lcd.finish()
-    if has_oled:
-        oled.clear()
-    if has_fan:
-        fan.off()
-    logger.info('Mole app ended.')
-    sys.exit(0)
+    neighbors = NeighborTable(config.getint('GLOBAL', 'max_neighbors', fallback=NeighborTable.MAX_ENTRIES))
+    cache_size = config.getint('GLOBAL', 'frame_cache', fallback=FrameCache.MAX_ENTRIES)
+    if cache_size > 0:
+        frame_cache = FrameCache(neighbors, cache_size)
+    pager = Pager(text_width, text_height, 1)
+    neighbor_pages = NeighborPages(neighbors, text_width, text_height, neighbor_lines, NEIGHBOR_LINES, cap_interfaces)
+    pager.set_source(neighbor_pages)
+    asyncio.run(run())
 
 
 if __name__ == '__main__':
-    signal.signal(signal.SIGTERM, sigterm_handler)
-    try:
-        main(sys.argv[1:])
-    except KeyboardInterrupt:
-        sigterm_handler(0, 0)
+    main(sys.argv[1:])
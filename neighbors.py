@@ -0,0 +1,204 @@
+import heapq
+import struct
+import threading
+import time
+
+from decoder import CDP_DST
+
+
+class Entry(object):
+    __slots__ = ('key', 'neighbor', 'first_seen', 'last_seen', 'expires', 'version')
+
+    def __init__(self, key, neighbor, now, expires, version=0):
+        self.key = key
+        self.neighbor = neighbor
+        self.first_seen = now
+        self.last_seen = now
+        self.expires = expires
+        self.version = version  # Table version of the last change of neighbor
+
+
+class NeighborTable(object):
+    MAX_ENTRIES: int = 4096
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.RLock()
+        # Insertion ordered, so the display order is stable
+        self._entries = {}
+        # (expires, key) min-heap, refreshed entries leave stale items behind that are skipped when popped
+        self._expiry = []
+        # Bumped on every change of an entry's data and of the membership, generation only for the latter
+        # and removals only for entries leaving
+        self.version = 0
+        self.generation = 0
+        self.removals = 0
+
+    @staticmethod
+    def key(neighbor):
+        # The same device seen on two capture interfaces is two neighbors
+        return neighbor.interface, neighbor.protocol, neighbor.device_id, neighbor.port
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def entries(self):
+        with self.lock:
+            return list(self._entries.values())
+
+    def newest(self, count):
+        # The count entries added last, oldest first
+        with self.lock:
+            entries = []
+            for key in reversed(self._entries):
+                if len(entries) >= count:
+                    break
+                entries.append(self._entries[key])
+        entries.reverse()
+        return entries
+
+    def update(self, neighbor, now=None):
+        # Returns (entry, new, changed)
+        if now is None:
+            now = time.monotonic()
+        key = NeighborTable.key(neighbor)
+        expires = now + neighbor.ttl
+        with self.lock:
+            entry = self._entries.get(key)
+            new = entry is None
+            changed = new or entry.neighbor != neighbor
+            if changed:
+                self.version += 1
+            if new:
+                if len(self._entries) >= self.max_entries:
+                    self._evict()
+                entry = Entry(key, neighbor, now, expires, self.version)
+                self._entries[key] = entry
+                self.generation += 1
+            else:
+                entry.neighbor = neighbor
+                entry.last_seen = now
+                entry.expires = expires
+                if changed:
+                    entry.version = self.version
+            heapq.heappush(self._expiry, (expires, key))
+            if len(self._expiry) > 4 * len(self._entries) + 16:
+                self._compact()
+        return entry, new, changed
+
+    def refresh(self, key, ttl, now=None):
+        # Pushes the expiry of an entry out without touching its data
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.last_seen = now
+            entry.expires = now + ttl
+            heapq.heappush(self._expiry, (entry.expires, key))
+            if len(self._expiry) > 4 * len(self._entries) + 16:
+                self._compact()
+        return entry
+
+    def expire(self, now=None):
+        # Removes and returns the entries whose TTL ran out
+        if now is None:
+            now = time.monotonic()
+        expired = []
+        with self.lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires, key = heapq.heappop(self._expiry)
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires == expires:
+                    del self._entries[key]
+                    expired.append(entry)
+            if expired:
+                self.version += 1
+                self.generation += 1
+                self.removals += 1
+        return expired
+
+    def next_expiry(self):
+        # Monotonic time of the next expiry, None when the table is empty
+        with self.lock:
+            while self._expiry:
+                expires, key = self._expiry[0]
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires == expires:
+                    return expires
+                heapq.heappop(self._expiry)
+        return None
+
+    def _evict(self):
+        # Drops the entry closest to expiry to make room
+        while self._expiry:
+            expires, key = heapq.heappop(self._expiry)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires == expires:
+                del self._entries[key]
+                self.version += 1
+                self.generation += 1
+                self.removals += 1
+                return entry
+        return None
+
+    def _compact(self):
+        self._expiry = [(entry.expires, key) for key, entry in self._entries.items()]
+        heapq.heapify(self._expiry)
+
+
+class FrameCache(object):
+    # Fingerprints of frames already handled: an identical re-advertisement only refreshes its neighbor
+    MAX_ENTRIES: int = 1024
+
+    def __init__(self, table, max_entries=MAX_ENTRIES):
+        self.table = table
+        self.max_entries = max_entries
+        self._entries = {}  # fingerprint -> (neighbor key, neighbor, expires)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(frame, interface=''):
+        if frame[:6] == CDP_DST and len(frame) >= 14:
+            # 802.3 length: padding up to the minimal frame size may be junk, leave it out
+            frame = frame[:14 + struct.unpack_from('!H', frame, 12)[0]]
+        return hash((interface, bytes(frame)))
+
+    def lookup(self, frame, interface='', now=None):
+        # Returns (neighbor key, fingerprint), the key is None on a miss
+        if now is None:
+            now = time.monotonic()
+        fingerprint = FrameCache.fingerprint(frame, interface)
+        cached = self._entries.get(fingerprint)
+        if cached is not None:
+            key, neighbor, expires = cached
+            entry = self.table.get(key)
+            # Still the neighbor this frame produced, not expired, evicted or updated from another frame since
+            if now < expires and entry is not None and entry.neighbor is neighbor:
+                self.table.refresh(key, neighbor.ttl, now)
+                self._entries[fingerprint] = (key, neighbor, now + neighbor.ttl)
+                self.hits += 1
+                return key, fingerprint
+            del self._entries[fingerprint]
+        self.misses += 1
+        return None, fingerprint
+
+    def store(self, fingerprint, entry, now=None):
+        if now is None:
+            now = time.monotonic()
+        if len(self._entries) >= self.max_entries:
+            self.purge(now)
+            if len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[fingerprint] = (entry.key, entry.neighbor, now + entry.neighbor.ttl)
+
+    def purge(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        for fingerprint in [fingerprint for fingerprint, cached in self._entries.items() if cached[2] <= now]:
+            del self._entries[fingerprint]
@@ -0,0 +1,200 @@
+import errno
+import logging
+import socket
+import struct
+
+NETLINK_ROUTE: int = 0
+RTMGRP_LINK: int = 0x001
+RTMGRP_IPV4_IFADDR: int = 0x010
+RTMGRP_IPV6_IFADDR: int = 0x100
+
+NLMSG_ERROR: int = 2
+NLMSG_DONE: int = 3
+RTM_NEWLINK: int = 16
+RTM_DELLINK: int = 17
+RTM_GETLINK: int = 18
+RTM_NEWADDR: int = 20
+RTM_DELADDR: int = 21
+RTM_GETADDR: int = 22
+NLM_F_REQUEST: int = 0x001
+NLM_F_DUMP: int = 0x300
+
+IFLA_IFNAME: int = 3
+IFA_ADDRESS: int = 1
+IFA_LOCAL: int = 2
+IFF_UP: int = 0x1
+IFF_LOWER_UP: int = 0x10000
+RT_SCOPE_UNIVERSE: int = 0
+
+NLMSGHDR = struct.Struct('=LHHLL')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBi')
+RTATTR = struct.Struct('=HH')
+
+
+class Interface(object):
+    __slots__ = ('name', 'index', 'up', 'ipv4', 'ipv6')
+
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+        self.up = False
+        self.ipv4 = []
+        self.ipv6 = []  # (address, scope)
+
+    def address(self):
+        # The address worth showing: IPv4 first, then a global IPv6, then a link-local one
+        if self.ipv4:
+            return self.ipv4[0]
+        for address, scope in self.ipv6:
+            if scope == RT_SCOPE_UNIVERSE:
+                return address
+        if self.ipv6:
+            return self.ipv6[0][0]
+        return ''
+
+
+def _attributes(data, offset, end):
+    attrs = {}
+    while offset + RTATTR.size <= end:
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs[attr_type] = data[offset + RTATTR.size:offset + length]
+        offset += (length + 3) & ~3
+    return attrs
+
+
+class AddressMonitor(object):
+    BUFFER_SIZE: int = 65536
+
+    def __init__(self, callback=None):
+        self.logger = logging.getLogger('mole')
+        # callback(interface) runs on the reader for every link or address change
+        self.callback = callback
+        self.interfaces = {}  # name -> Interface
+        self._by_index = {}   # index -> Interface
+        self._dumps = []
+        self._seq = 0
+        self.sock = None
+
+    def open(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        self.resync()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def setblocking(self, flag):
+        self.sock.setblocking(flag)
+
+    def resync(self):
+        # Link dump first so addresses can be matched to interface names, one dump at a time
+        self._dumps = [RTM_GETLINK, RTM_GETADDR]
+        self._request_dump()
+
+    def _request_dump(self):
+        if not self._dumps:
+            return
+        msg_type = self._dumps.pop(0)
+        self._seq += 1
+        # rtgenmsg: only the address family, padded to 4 bytes
+        payload = struct.pack('=Bxxx', socket.AF_UNSPEC)
+        self.sock.send(NLMSGHDR.pack(NLMSGHDR.size + len(payload), msg_type, NLM_F_REQUEST | NLM_F_DUMP,
+                                     self._seq, 0) + payload)
+
+    def read(self):
+        try:
+            data = self.sock.recv(AddressMonitor.BUFFER_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            if self.sock is None:
+                return  # Closed while waiting
+            if e.errno != errno.ENOBUFS:
+                raise
+            # Events were lost, rebuild the state from scratch
+            self.logger.warning('Netlink receive buffer overrun, resyncing interfaces.')
+            for interface in self.interfaces.values():
+                interface.ipv4 = []
+                interface.ipv6 = []
+            self.resync()
+            return
+        offset = 0
+        while offset + NLMSGHDR.size <= len(data):
+            length, msg_type, flags, seq, pid = NLMSGHDR.unpack_from(data, offset)
+            if length < NLMSGHDR.size:
+                break
+            body = offset + NLMSGHDR.size
+            end = offset + length
+            if msg_type == NLMSG_DONE or msg_type == NLMSG_ERROR:
+                self._request_dump()
+            elif msg_type in (RTM_NEWLINK, RTM_DELLINK):
+                self._link(data, body, end, msg_type == RTM_NEWLINK)
+            elif msg_type in (RTM_NEWADDR, RTM_DELADDR):
+                self._address(data, body, end, msg_type == RTM_NEWADDR)
+            offset += (length + 3) & ~3
+
+    def _changed(self, interface):
+        if self.callback is not None:
+            self.callback(interface)
+
+    def _link(self, data, offset, end, new):
+        family, if_type, index, flags, change = IFINFOMSG.unpack_from(data, offset)
+        attrs = _attributes(data, offset + IFINFOMSG.size, end)
+        interface = self._by_index.get(index)
+        if not new:
+            if interface is not None:
+                del self._by_index[index]
+                self.interfaces.pop(interface.name, None)
+                interface.up = False
+                interface.ipv4 = []
+                interface.ipv6 = []
+                self._changed(interface)
+            return
+        if IFLA_IFNAME not in attrs:
+            return
+        name = bytes(attrs[IFLA_IFNAME]).rstrip(b'\x00').decode()
+        if interface is None or interface.name != name:
+            if interface is not None:
+                self.interfaces.pop(interface.name, None)
+            interface = Interface(name, index)
+            self._by_index[index] = interface
+            self.interfaces[name] = interface
+        up = flags & (IFF_UP | IFF_LOWER_UP) == IFF_UP | IFF_LOWER_UP
+        if up != interface.up:
+            interface.up = up
+            self._changed(interface)
+
+    def _address(self, data, offset, end, new):
+        family, prefixlen, flags, scope, index = IFADDRMSG.unpack_from(data, offset)
+        interface = self._by_index.get(index)
+        if interface is None:
+            return
+        attrs = _attributes(data, offset + IFADDRMSG.size, end)
+        if family == socket.AF_INET:
+            raw = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+            addresses = interface.ipv4
+        elif family == socket.AF_INET6:
+            raw = attrs.get(IFA_ADDRESS)
+            addresses = interface.ipv6
+        else:
+            return
+        if raw is None:
+            return
+        address = socket.inet_ntop(family, bytes(raw))
+        if family == socket.AF_INET6:
+            address = (address, scope)
+        if new and address not in addresses:
+            addresses.append(address)
+        elif not new and address in addresses:
+            addresses.remove(address)
+        else:
+            return
+        self._changed(interface)
@@ -1,36 +1,233 @@
+import threading
+
+
+def first_overflow(lines, width):
+    # The line a display may scroll: the first one longer than width, -1 when all of them fit
+    return next((i for i, line in enumerate(lines) if len(line) > width), -1)
+
+
 class Pager(object):
+    # pages static pages held in buffers, followed by the virtual pages of source, formatted only when shown
     def __init__(self, width=16, height=2, pages=2):
         self.width: int = width
         self.height: int = height
         self.pages: int = pages
+        self.source = None
         self._active_page: int = 0
         self._buffer = [[" ".ljust(width) for i in range(height)] for j in range(pages)]
+        # Bumped on every change, per page and for the whole pager
+        self.version: int = 0
+        self._page_versions = [0 for j in range(pages)]
+        # Per page the line a display may scroll when it is too long, -1 for none
+        self._marquees = [-1 for j in range(pages)]
+        self.lock = threading.Lock()
+        # Called after every change, e.g. to wake an event loop
+        self.listener = None
+
+    def _notify(self):
+        # Must be called with self.lock held
+        if self.listener is not None:
+            self.listener()
+
+    def _touch(self, page: int):
+        # Must be called with self.lock held
+        self.version += 1
+        self._page_versions[page] = self.version
+        self._notify()
+
+    def set_source(self, source):
+        # source: count(), page(index) -> (lines, version) and marquee(index) of its virtual pages
+        with self.lock:
+            self.source = source
+            self.version += 1
+            self._notify()
+
+    def page_count(self):
+        if self.source is None:
+            return self.pages
+        return self.pages + self.source.count()
+
+    def _virtual(self, page: int):
+        # Lines and version of a virtual page, None past the last one
+        if self.source is None or page < self.pages or page >= self.page_count():
+            return None
+        return self.source.page(page - self.pages)
 
     def get_line(self, page: int, line: int):
-        if page < self.pages and line < self.height:
+        if line >= self.height:
+            return None
+        if page < self.pages:
             return self._buffer[page][line]
+        virtual = self._virtual(page)
+        if virtual is not None:
+            return virtual[0][line]
 
     def get_page(self, page: int):
         if page < self.pages:
             return self._buffer[page]
+        virtual = self._virtual(page)
+        if virtual is not None:
+            return virtual[0]
 
     def get_active_page(self):
-        return self._buffer[self._active_page]
+        return self.get_page(self._active_page)
+
+    def get_marquee(self, page: int):
+        if page < self.pages:
+            return self._marquees[page]
+        if self.source is not None and page < self.page_count():
+            return self.source.marquee(page - self.pages)
+        return -1
+
+    def snapshot(self):
+        # Active page number, a copy of its lines and its version, read consistently
+        with self.lock:
+            if self._active_page >= self.page_count():
+                self._active_page = 0  # The source shrank under the active page
+            page = self._active_page
+            if page < self.pages:
+                return page, list(self._buffer[page]), self._page_versions[page]
+            lines, version = self.source.page(page - self.pages)
+            return page, list(lines), version
 
     def set_line(self, page: int, line: int, string: str):
-        if page < self.pages and line < self.height:
-            self._buffer[page][line] = string.ljust(self.width)
+        with self.lock:
+            if page < self.pages and line < self.height:
+                string = string.ljust(self.width)
+                if self._buffer[page][line] != string:
+                    self._buffer[page][line] = string
+                    self._marquees[page] = first_overflow(self._buffer[page], self.width)
+                    self._touch(page)
 
     def set_page(self, page: int, data):
-        if page < self.pages:
-            self._buffer[page] = data
+        with self.lock:
+            if page < self.pages:
+                self._buffer[page] = data
+                self._marquees[page] = first_overflow(data, self.width)
+                self._touch(page)
 
     def set_active_page(self, page: int):
-        if page < self.pages:
-            self._active_page = page
+        with self.lock:
+            if page < self.page_count() and page != self._active_page:
+                self._active_page = page
+                self.version += 1
+                self._notify()
 
     def next_page(self):
-        if self._active_page < self.pages - 1:
-            self._active_page += 1
-        else:
-            self._active_page = 0
+        with self.lock:
+            if self._active_page < self.page_count() - 1:
+                self._active_page += 1
+            else:
+                self._active_page = 0
+            self.version += 1
+            self._notify()
+
+    def notify(self):
+        with self.lock:
+            self.version += 1
+            self._notify()
+
+
+class NeighborPages(object):
+    # Virtual pages over a NeighborTable: every capture interface, with a title page when there are several,
+    # then the pages of its neighbors. Laid out again only when the table's members change, formatted
+    # only when a page is shown and kept until its neighbor changes.
+    def __init__(self, table, width, height, format_lines, lines_per_neighbor, interfaces=()):
+        self.table = table
+        self.width = width
+        self.height = height
+        self.format_lines = format_lines  # Neighbor -> list of lines
+        self.per_neighbor = -(-lines_per_neighbor // height)
+        self.interfaces = list(interfaces)
+        self._layout = []  # Per page: (entry, page of the neighbor) or (None, (interface, neighbors))
+        self._first = {}  # Neighbor key -> first page
+        self._generation = -1
+        self._removals = -1
+        self._titled = False
+        self._group = None  # The one interface of an untitled layout
+        self._version = 0  # Table version the layout was built at
+        self._formatted = {}  # Neighbor key -> (entry version, pages of lines, marquee per page)
+
+    def _append(self):
+        # Neighbors only joined since the last layout and there are no title pages: they go at the end
+        added = len(self.table) - len(self._first)
+        if self._titled or self._removals != self.table.removals or added <= 0:
+            return False
+        entries = self.table.newest(added)
+        group = self._group if self._group is not None else entries[0].neighbor.interface
+        if any(entry.neighbor.interface != group or entry.key in self._first for entry in entries):
+            return False
+        self._group = group
+        for entry in entries:
+            self._first[entry.key] = len(self._layout)
+            self._layout.extend((entry, i) for i in range(self.per_neighbor))
+        return True
+
+    def _build(self):
+        with self.table.lock:
+            if self._generation == self.table.generation:
+                return
+            if self._append():
+                self._generation = self.table.generation
+                self._version = self.table.version
+                return
+            groups = {interface: [] for interface in self.interfaces}
+            for entry in self.table.entries():
+                groups.setdefault(entry.neighbor.interface, []).append(entry)
+            titled = len(groups) > 1
+            layout = []
+            first = {}
+            for interface, entries in groups.items():
+                if titled:
+                    layout.append((None, (interface, len(entries))))
+                for entry in entries:
+                    first[entry.key] = len(layout)
+                    layout.extend((entry, i) for i in range(self.per_neighbor))
+            self._layout = layout
+            self._first = first
+            self._titled = titled
+            self._group = next(iter(groups)) if len(groups) == 1 else None
+            self._removals = self.table.removals
+            self._formatted = {key: formatted for key, formatted in self._formatted.items() if key in first}
+            self._generation = self.table.generation
+            self._version = self.table.version
+
+    def count(self):
+        self._build()
+        return len(self._layout)
+
+    def first_page(self, key):
+        # Virtual page a neighbor starts on, -1 when it is not in the table
+        self._build()
+        return self._first.get(key, -1)
+
+    def _format(self, entry):
+        formatted = self._formatted.get(entry.key)
+        if formatted is None or formatted[0] != entry.version:
+            lines = [line.ljust(self.width) for line in self.format_lines(entry.neighbor)]
+            lines.extend(' ' * self.width for i in range(self.per_neighbor * self.height - len(lines)))
+            pages = [lines[i * self.height:(i + 1) * self.height] for i in range(self.per_neighbor)]
+            # The first line of a page that does not fit may scroll, the displays truncate all others
+            marquees = [first_overflow(page, self.width) for page in pages]
+            formatted = (entry.version, pages, marquees)
+            self._formatted[entry.key] = formatted
+        return formatted
+
+    def page(self, index):
+        self._build()
+        entry, part = self._layout[index]
+        if entry is None:
+            interface, count = part
+            lines = [interface, (str(count) if count else 'No') + ' neighbor' + ('' if count == 1 else 's')]
+            lines = [line.ljust(self.width) for line in lines[:self.height]]
+            lines.extend(' ' * self.width for i in range(self.height - len(lines)))
+            return lines, self._version
+        version, pages, marquees = self._format(entry)
+        return pages[part], max(version, self._version)
+
+    def marquee(self, index):
+        self._build()
+        entry, part = self._layout[index]
+        if entry is None:
+            return -1
+        return self._format(entry)[2][part]
@@ -0,0 +1,183 @@
+import logging
+import mmap
+import os
+import struct
+
+from decoder import CDP_DST, LLDP_ETHERTYPE
+
+LINKTYPE_ETHERNET: int = 1
+
+PCAP_MAGIC_USEC: int = 0xa1b2c3d4
+PCAP_MAGIC_NSEC: int = 0xa1b23c4d
+PCAPNG_SHB: int = 0x0a0d0d0a
+PCAPNG_BYTE_ORDER: int = 0x1a2b3c4d
+PCAPNG_IDB: int = 0x00000001
+PCAPNG_OPB: int = 0x00000002
+PCAPNG_SPB: int = 0x00000003
+PCAPNG_EPB: int = 0x00000006
+PCAPNG_OPT_IF_NAME: int = 2
+PCAPNG_OPT_IF_TSRESOL: int = 9
+
+LLDP_TYPE: bytes = struct.pack('!H', LLDP_ETHERTYPE)
+CDP_SNAP: bytes = b'\x03\x00\x00\x0c\x20\x00'
+
+
+def prefilter(data, offset, length):
+    # CDP_FILTER evaluated in place on the mapped file, only frames passing it are copied and decoded
+    if length < 14:
+        return False
+    if data[offset + 12:offset + 14] == LLDP_TYPE:
+        return True
+    return length >= 22 and data[offset:offset + 6] == CDP_DST and data[offset + 16:offset + 22] == CDP_SNAP
+
+
+class PcapReader(object):
+    # Streams CDP and LLDP frames out of a pcap or pcapng file through mmap
+    def __init__(self, path):
+        self.logger = logging.getLogger('mole')
+        self.path = path
+        self.name = os.path.basename(path)
+        self.file = None
+        self.data = None
+        self.frames_read = 0
+        self.frames_matched = 0
+
+    def open(self):
+        self.file = open(self.path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.data.madvise(mmap.MADV_SEQUENTIAL)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def frames(self):
+        # Yields (interface, timestamp, frame) for every frame the prefilter lets through
+        if len(self.data) < 4:
+            return
+        magic = struct.unpack_from('=I', self.data, 0)[0]
+        if magic == PCAPNG_SHB:
+            yield from self._pcapng()
+        else:
+            yield from self._pcap()
+
+    def _pcap(self):
+        data = self.data
+        for order in ('<', '>'):
+            magic = struct.unpack_from(order + 'I', data, 0)[0]
+            if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+                break
+        else:
+            raise ValueError(self.path + ' is not a pcap or pcapng file')
+        scale = 1e-9 if magic == PCAP_MAGIC_NSEC else 1e-6
+        linktype = struct.unpack_from(order + 'I', data, 20)[0] & 0x0fffffff
+        if linktype != LINKTYPE_ETHERNET:
+            self.logger.warning(self.path + ': link type ' + str(linktype) + ' is not Ethernet, skipped.')
+            return
+        record = struct.Struct(order + 'IIII')
+        unpack_from = record.unpack_from
+        end = len(data)
+        offset = 24
+        read = matched = 0
+        while offset + 16 <= end:
+            seconds, fraction, caplen, length = unpack_from(data, offset)
+            offset += 16
+            read += 1
+            if prefilter(data, offset, caplen):
+                matched += 1
+                yield self.name, seconds + fraction * scale, data[offset:offset + caplen]
+            offset += caplen
+        self.frames_read += read
+        self.frames_matched += matched
+
+    def _pcapng(self):
+        data = self.data
+        end = len(data)
+        offset = 0
+        order = '<'
+        interfaces = []  # (name, link type, timestamp units per second) per interface id of the section
+        read = matched = 0
+        # Block type and length plus the enhanced packet block fields up to the captured length
+        block = struct.Struct('<IIIIII')
+        header = struct.Struct('<II')
+        while offset + 12 <= end:
+            if offset + block.size <= end:
+                block_type, block_length, interface_id, high, low, caplen = block.unpack_from(data, offset)
+            else:
+                block_type, block_length = header.unpack_from(data, offset)
+            if block_type == PCAPNG_EPB and 32 <= block_length <= end - offset:
+                # The hot path: CDP_FILTER on the frame in place before anything else
+                start = offset + 28
+                read += 1
+                if (data[start + 12:start + 14] == LLDP_TYPE or data[start:start + 6] == CDP_DST) and \
+                        interface_id < len(interfaces) and prefilter(data, start, caplen):
+                    name, linktype, units = interfaces[interface_id]
+                    if linktype == LINKTYPE_ETHERNET:
+                        matched += 1
+                        yield name, ((high << 32) | low) / units, data[start:start + caplen]
+                offset += block_length
+                continue
+            if block_type == PCAPNG_SHB:
+                # Every section carries its own byte order and interface list
+                if struct.unpack_from('<I', data, offset + 8)[0] == PCAPNG_BYTE_ORDER:
+                    order = '<'
+                else:
+                    order = '>'
+                block = struct.Struct(order + 'IIIIII')
+                header = struct.Struct(order + 'II')
+                block_length = header.unpack_from(data, offset)[1]
+                interfaces = []
+            if block_length < 12 or offset + block_length > end:
+                self.logger.warning(self.path + ': truncated block at offset ' + str(offset) + '.')
+                break
+            body = offset + 8
+            if block_type == PCAPNG_OPB:
+                interface_id, drops, high, low, caplen = struct.unpack_from(order + 'HHIII', data, body)
+                read += 1
+                if interface_id < len(interfaces) and prefilter(data, body + 20, caplen):
+                    name, linktype, units = interfaces[interface_id]
+                    if linktype == LINKTYPE_ETHERNET:
+                        matched += 1
+                        yield name, ((high << 32) | low) / units, data[body + 20:body + 20 + caplen]
+            elif block_type == PCAPNG_SPB:
+                read += 1
+                if interfaces:
+                    name, linktype, units = interfaces[0]
+                    caplen = block_length - 16
+                    if linktype == LINKTYPE_ETHERNET and prefilter(data, body + 4, caplen):
+                        matched += 1
+                        # Simple packet blocks have no timestamp
+                        yield name, 0.0, data[body + 4:body + 4 + caplen]
+            elif block_type == PCAPNG_IDB:
+                interfaces.append(self._interface(data, order, body, offset + block_length - 4,
+                                                  len(interfaces)))
+            offset += block_length
+        self.frames_read += read
+        self.frames_matched += matched
+
+    def _interface(self, data, order, offset, end, interface_id):
+        linktype = struct.unpack_from(order + 'H', data, offset)[0]
+        name = self.name + '#' + str(interface_id)
+        units = 1e6
+        offset += 8
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(order + 'HH', data, offset)
+            if code == 0:
+                break
+            value = data[offset + 4:offset + 4 + length]
+            if code == PCAPNG_OPT_IF_NAME:
+                name = value.rstrip(b'\x00').decode('utf-8', 'replace')
+            elif code == PCAPNG_OPT_IF_TSRESOL and length >= 1:
+                if value[0] & 0x80:
+                    units = float(2 ** (value[0] & 0x7f))
+                else:
+                    units = float(10 ** value[0])
+            offset += 4 + ((length + 3) & ~3)
+        if linktype != LINKTYPE_ETHERNET:
+            self.logger.warning(self.path + ': interface ' + name + ' is not Ethernet, skipped.')
+        return name, linktype, units
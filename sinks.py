@@ -0,0 +1,76 @@
+import logging
+import threading
+
+
+class Frame(object):
+    # One page as formatted for every display
+    __slots__ = ('page', 'lines', 'marquee', 'version')
+
+    def __init__(self, page, lines, marquee=-1, version=0):
+        self.page = page
+        self.lines = lines
+        self.marquee = marquee
+        self.version = version
+
+
+class DisplaySink(object):
+    # A display with its own thread, fed through a single-slot mailbox: a frame still waiting when the next one
+    # arrives is dropped, so a slow display skips stale frames instead of falling behind
+    def __init__(self, name, draw):
+        self.logger = logging.getLogger('mole')
+        self.name = name
+        self.draw = draw  # Called with every frame on the sink thread
+        self.listener = None  # Called with every drawn frame on the sink thread
+        self.last = None  # Last frame drawn
+        self.drawn = 0
+        self.dropped = 0
+        self._slot = None
+        self._busy = False
+        self._stopping = False
+        self._changed = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='sink-' + name, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def push(self, frame):
+        with self._changed:
+            if self._slot is not None:
+                self.dropped += 1
+            self._slot = frame
+            self._changed.notify_all()
+
+    def flush(self, timeout=None):
+        # Blocks until the mailbox is empty and nothing is being drawn
+        with self._changed:
+            return self._changed.wait_for(lambda: self._slot is None and not self._busy, timeout)
+
+    def stop(self, timeout=None):
+        # Draws what is still in the mailbox, then ends the thread
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def run(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._slot is not None or self._stopping)
+                frame = self._slot
+                if frame is None:
+                    return
+                self._slot = None
+                self._busy = True
+            try:
+                self.draw(frame)
+                self.last = frame
+                self.drawn += 1
+                if self.listener is not None:
+                    self.listener(frame)
+            except Exception:
+                self.logger.exception('Drawing page ' + str(frame.page) + ' on ' + self.name + ' failed')
+            finally:
+                with self._changed:
+                    self._busy = False
+                    self._changed.notify_all()
@@ -0,0 +1,127 @@
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+
+from decoder import CDP_DEFAULT_TTL, LLDP_DEFAULT_TTL, Neighbor
+
+# Only the fields the neighbor record needs, in output column order
+FIELDS = ('frame.interface_name',
+          'cdp.deviceid', 'cdp.portid', 'cdp.capabilities', 'cdp.native_vlan', 'cdp.platform',
+          'cdp.software_version', 'cdp.nrgyz.ip_address', 'cdp.ttl',
+          'lldp.tlv.system.name', 'lldp.tlv.system_cap', 'lldp.port.id', 'lldp.port.id.mac', 'lldp.chassis.id.ip4',
+          'lldp.mgn.addr.ip4', 'lldp.media.vlan.id', 'lldp.media.model', 'lldp.media.sn', 'lldp.time_to_live')
+DISPLAY_FILTER: str = 'cdp or lldp'
+
+
+def parse(line, interface=''):
+    # One line of tshark -T fields output to a Neighbor, None for lines that are neither CDP nor LLDP
+    values = line.split('\t')
+    if len(values) != len(FIELDS):
+        return None
+    (interface_name, device_id, port_id, capabilities, native_vlan, platform, software, ip, ttl, system_name,
+     system_cap, port, port_mac, chassis_ip, management_ip, media_vlan, model, serial, time_to_live) = values
+    if interface_name == '':
+        interface_name = interface
+    if device_id != '':
+        return Neighbor('CDP', device_id, port_id, native_vlan, platform, software.replace('\\n', '\n'), ip=ip,
+                        capabilities=int(capabilities or '0', base=16), ttl=int(ttl or CDP_DEFAULT_TTL),
+                        interface=interface_name)
+    if system_name != '':
+        return Neighbor('LLDP', system_name, port or port_mac, media_vlan, model=model, serial=serial,
+                        ip=chassis_ip or management_ip, capabilities=int(system_cap or '0', base=16),
+                        ttl=int(time_to_live or LLDP_DEFAULT_TTL), interface=interface_name)
+    return None
+
+
+class TsharkCapture(object):
+    # tshark dissecting into a fixed list of fields, one line per frame, read as a stream by the event loop
+    PROGRAM: str = 'tshark'
+    READ_SIZE: int = 65536
+    MESSAGES_SIZE: int = 4096  # Tail of stderr kept for the log
+
+    def __init__(self, interfaces=('eth0',), capture_filter='', path=None, program=PROGRAM):
+        self.logger = logging.getLogger('mole')
+        self.interfaces = list(interfaces)
+        self.capture_filter = capture_filter
+        self.path = path  # Read this capture file instead of the interfaces
+        self.program = program
+        self.process = None
+        self.stderr = None  # A file rather than a pipe, tshark can never block on it
+        self._partial = b''
+
+    @staticmethod
+    def available(program=PROGRAM):
+        return shutil.which(program) is not None
+
+    def command(self):
+        # -l flushes every line, -q and -Q would suppress the packet output along with the status messages
+        command = [self.program, '-l', '-n']
+        if self.path is not None:
+            command += ['-r', self.path, '-Y', DISPLAY_FILTER]
+        else:
+            # A capture filter only applies to the -i before it, every interface gets its own
+            for interface in self.interfaces:
+                command += ['-i', interface]
+                if self.capture_filter != '':
+                    command += ['-f', self.capture_filter]
+        command += ['-T', 'fields', '-E', 'separator=/t', '-E', 'occurrence=f', '-E', 'quote=n']
+        for field in FIELDS:
+            command += ['-e', field]
+        return command
+
+    def start(self):
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(self.command(), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                        stderr=self.stderr, bufsize=0, start_new_session=True)
+        os.set_blocking(self.process.stdout.fileno(), False)
+
+    def fileno(self):
+        return self.process.stdout.fileno()
+
+    def messages(self):
+        # The last lines tshark wrote to stderr, e.g. why it stopped
+        if self.stderr is None:
+            return []
+        self.stderr.seek(0, os.SEEK_END)
+        self.stderr.seek(max(0, self.stderr.tell() - TsharkCapture.MESSAGES_SIZE))
+        lines = self.stderr.read().decode('utf-8', 'replace').splitlines()
+        return [line.strip() for line in lines if line.strip() != '']
+
+    def read(self):
+        # Neighbors of the complete lines available, None once tshark closed its output
+        try:
+            data = os.read(self.process.stdout.fileno(), TsharkCapture.READ_SIZE)
+        except BlockingIOError:
+            return []
+        if data == b'':
+            return None
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        interface = self.interfaces[0] if self.interfaces else ''
+        neighbors = []
+        for line in lines:
+            try:
+                neighbor = parse(line.decode('utf-8', 'replace'), interface)
+            except ValueError:
+                continue  # A number field tshark printed in a form parse() does not know
+            if neighbor is not None:
+                neighbors.append(neighbor)
+        return neighbors
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            try:
+                self.process.wait(2)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+        self.process.stdout.close()
+        self.process = None
+        self.stderr.close()
+        self.stderr = None